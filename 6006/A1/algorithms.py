@@ -23,11 +23,8 @@ def algorithm1(problem, trace = None):
     subproblems.append((subStartR, subStartC1, subNumR, subNumC1))
     subproblems.append((subStartR, subStartC2, subNumR, subNumC2))
 
-    # get a list of all locations in the dividing column
-    divider = crossProduct(range(problem.numRow), [mid])
-
     # find the maximum in the dividing column
-    bestLoc = problem.getMaximum(divider, trace)
+    bestLoc = problem.getColumnMaximum(mid, trace)
 
     # see if the maximum value we found on the dividing line has a better
     # neighbor (which cannot be on the dividing line, because we know that
@@ -84,12 +81,7 @@ def algorithm3(problem, bestSeen = None, trace = None):
 
     # find the best location on the cross (the middle row combined with the
     # middle column)
-    cross = []
-
-    cross.extend(crossProduct([midRow], range(problem.numCol)))
-    cross.extend(crossProduct(range(problem.numRow), [midCol]))
-
-    crossLoc = problem.getMaximum(cross, trace)
+    crossLoc = problem.getCrossMaximum(midRow, midCol, trace)
     neighbor = problem.getBetterNeighbor(crossLoc, trace)
 
     # update the best we've seen so far based on this new maximum
@@ -116,7 +108,6 @@ def algorithm4(problem, bestSeen = None, rowSplit = True, trace = None):
         return None
 
     subproblems = []
-    divider = []
 
     if rowSplit:
         # the recursive subproblem will involve half the number of rows
@@ -130,8 +121,8 @@ def algorithm4(problem, bestSeen = None, rowSplit = True, trace = None):
         subproblems.append((subStartR1, subStartC, subNumR1, subNumC))
         subproblems.append((subStartR2, subStartC, subNumR2, subNumC))
 
-        # get a list of all locations in the dividing column
-        divider = crossProduct([mid], range(problem.numCol))
+        # find the maximum in the dividing row
+        bestLoc = problem.getRowMaximum(mid, trace)
     else:
         # the recursive subproblem will involve half the number of columns
         mid = problem.numCol // 2
@@ -144,11 +135,9 @@ def algorithm4(problem, bestSeen = None, rowSplit = True, trace = None):
         subproblems.append((subStartR, subStartC1, subNumR, subNumC1))
         subproblems.append((subStartR, subStartC2, subNumR, subNumC2))
 
-        # get a list of all locations in the dividing column
-        divider = crossProduct(range(problem.numRow), [mid])
+        # find the maximum in the dividing column
+        bestLoc = problem.getColumnMaximum(mid, trace)
 
-    # find the maximum in the dividing row or column
-    bestLoc = problem.getMaximum(divider, trace)
     neighbor = problem.getBetterNeighbor(bestLoc, trace)
 
     # update the best we've seen so far based on this new maximum
@@ -0,0 +1,190 @@
+import ast
+import fnmatch
+import multiprocessing
+import os
+import sys
+import time
+import iterative
+import main
+import matrixfile
+
+################################################################################
+############################ Batch Peak Finding ################################
+################################################################################
+
+# The algorithms that can be picked for a job, by name.  The loop-based
+# versions are used, since they give the same peaks as algorithms.py without
+# running into the recursion limit on tall matrices.
+algorithmTable = {"algorithm1" : iterative.algorithm1,
+                  "algorithm2" : iterative.algorithm2,
+                  "algorithm3" : iterative.algorithm3,
+                  "algorithm4" : iterative.algorithm4}
+
+defaultAlgorithm = "algorithm4"
+
+# The names of the Python problem files picked from a directory, as written by
+# generate.py.
+problemPattern = "problem*.py"
+
+def definesProblem(filename, variable = "problemMatrix"):
+    """
+    Checks whether a Python problem file assigns the problem matrix at its top
+    level, by parsing it rather than executing it.
+    """
+
+    try:
+        with open(filename) as handle:
+            module = ast.parse(handle.read(), filename)
+    except (SyntaxError, ValueError):
+        return False
+
+    for statement in module.body:
+        if isinstance(statement, ast.Assign):
+            for target in statement.targets:
+                if isinstance(target, ast.Name) and target.id == variable:
+                    return True
+    return False
+
+def readJobs(source, algorithm = defaultAlgorithm):
+    """
+    Builds the list of jobs to run, as (filename, algorithm name) pairs.
+
+    The source is either a directory, in which case every binary matrix file
+    and Python problem file in it becomes a job, or a manifest file with one
+    job per line: the name of a problem file (relative to the manifest),
+    optionally followed by the name of the algorithm to run on it.  Blank lines
+    and lines starting with # are ignored.
+
+    Python problem files are executed to load them, so in a directory, only
+    files named like those written by generate.py (problem*.py) are picked,
+    and those that don't assign problemMatrix are skipped without running
+    them.
+    """
+
+    jobs = []
+
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            filename = os.path.join(source, name)
+            if name.endswith(matrixfile.EXTENSION) or (
+                    fnmatch.fnmatch(name, problemPattern) and
+                    definesProblem(filename)):
+                jobs.append((filename, algorithm))
+        return jobs
+
+    directory = os.path.dirname(source)
+    with open(source) as manifest:
+        for line in manifest:
+            fields = line.split()
+            if len(fields) == 0 or fields[0].startswith("#"):
+                continue
+            if len(fields) > 2:
+                raise ValueError("Invalid manifest line: %s" % line.strip())
+            name = fields[1] if len(fields) > 1 else algorithm
+            if name not in algorithmTable:
+                raise ValueError("Unknown algorithm %s" % name)
+            jobs.append((os.path.join(directory, fields[0]), name))
+
+    return jobs
+
+def solveJob(job):
+    """
+    Runs one job in a worker process.  The problem is loaded by the worker
+    itself, so binary matrix files are memory-mapped (and shared through the
+    page cache) rather than pickled and sent over from the parent.
+
+    Returns a tuple (filename, algorithm name, peak, status, seconds).
+    """
+
+    (filename, name) = job
+    start = time.time()
+
+    try:
+        with main.loadProblem(filename) as problem:
+            peak = algorithmTable[name](problem)
+            if peak is None:
+                status = "empty"
+            elif problem.isPeak(peak):
+                status = "peak"
+            else:
+                status = "incorrect"
+    except Exception as error:
+        (peak, status) = (None, "error:%s" % type(error).__name__)
+
+    return (filename, name, peak, status, time.time() - start)
+
+def formatResult(result):
+    """
+    Formats a result from solveJob() as one tab-separated line.
+    """
+
+    (filename, name, peak, status, seconds) = result
+    (row, col) = ("-", "-") if peak is None else peak
+    return "%s\t%s\t%s\t%s\t%s\t%.6f\n" % (filename, name, row, col, status,
+                                          seconds)
+
+def runBatch(jobs, output, processes = None):
+    """
+    Runs the given jobs over a pool of worker processes (one per core by
+    default), writing one line per job to the output file object in the
+    order of the jobs.  Returns the number of jobs whose result is not a
+    peak.
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    # hand out jobs in chunks, so that workers don't wait on the parent for
+    # every small matrix, but still several chunks per worker to balance load
+    chunksize = max(1, len(jobs) // (processes * 4))
+    failures = 0
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(solveJob, jobs, chunksize):
+            if result[3] not in ("peak", "empty"):
+                failures += 1
+            output.write(formatResult(result))
+    finally:
+        pool.close()
+        pool.join()
+
+    return failures
+
+def batchMain():
+    """
+    Command line entry point:
+
+        python batch.py <directory or manifest> [<results> [<algorithm>
+                        [<processes>]]]
+    """
+
+    if len(sys.argv) < 2:
+        print("usage: python batch.py <directory or manifest> [<results> "
+              "[<algorithm> [<processes>]]]")
+        return 2
+
+    resultsName = "results.tsv"
+    if len(sys.argv) > 2:
+        resultsName = sys.argv[2]
+
+    algorithm = defaultAlgorithm
+    if len(sys.argv) > 3:
+        algorithm = sys.argv[3]
+    if algorithm not in algorithmTable:
+        print("Unknown algorithm %s" % algorithm)
+        return 2
+
+    processes = None
+    if len(sys.argv) > 4:
+        processes = int(sys.argv[4])
+
+    jobs = readJobs(sys.argv[1], algorithm)
+    with open(resultsName, "w") as output:
+        failures = runBatch(jobs, output, processes)
+
+    print("Solved %d problems, %d failed." % (len(jobs), failures))
+    return 1 if failures > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(batchMain())
@@ -0,0 +1,171 @@
+import random
+import sys
+import time
+import algorithms
+import generate
+import instrument
+import iterative
+import peak
+import trace
+
+################################################################################
+############################ Benchmarking Algorithms ###########################
+################################################################################
+
+# The matrices to benchmark on, by name.  Each generator takes the number of
+# rows and columns, and the seeded random.Random to draw random cells from,
+# so that every run benchmarks the same matrices.
+generatorList = [("random", lambda rows, cols, rng:
+                      generate.randomProblem(rows, cols, rng = rng)),
+                 ("snake", lambda rows, cols, rng:
+                      generate.snakeProblem(rows, cols)),
+                 ("spiral", lambda rows, cols, rng:
+                      generate.spiralProblem(rows, cols)),
+                 ("staircase", lambda rows, cols, rng:
+                      generate.staircaseProblem(rows, cols)),
+                 ("plateau", lambda rows, cols, rng:
+                      generate.plateauProblem(rows, cols, rng = rng))]
+
+# The algorithms to benchmark.  The recursion depth of an algorithm is one
+# more than the number of times the given trace event is recorded, since that
+# event is recorded right before every recursive call.  The loop-based
+# versions from iterative.py never recurse, but the same events count their
+# iterations.
+algorithmList = [("algorithm1", algorithms.algorithm1, "subproblem"),
+                 ("algorithm2", algorithms.algorithm2, "foundNeighbor"),
+                 ("algorithm3", algorithms.algorithm3, "subproblem"),
+                 ("algorithm4", algorithms.algorithm4, "subproblem"),
+                 ("iterative1", iterative.algorithm1, "subproblem"),
+                 ("iterative2", iterative.algorithm2, "foundNeighbor"),
+                 ("iterative3", iterative.algorithm3, "subproblem"),
+                 ("iterative4", iterative.algorithm4, "subproblem")]
+
+defaultSizes = [16, 64, 256]
+
+defaultSeed = 6006
+
+columnNames = ["matrix", "rows", "cols", "algorithm", "status", "seconds",
+               "probes", "depth"]
+
+class CountingTraceRecord(trace.CompactTraceRecord):
+    """
+    A trace that only counts how many events of each type are recorded.
+    """
+
+    def __init__(self):
+        trace.CompactTraceRecord.__init__(self)
+        self.counts = {}
+
+    def record(self, event):
+        self.counts[event["type"]] = self.counts.get(event["type"], 0) + 1
+
+def runAlgorithm(function, matrix):
+    """
+    Runs an algorithm on a matrix twice: once on a plain PeakProblem, to time
+    it, and once on a ProfiledPeakProblem with a CountingTraceRecord, to count
+    the cells it reads and its trace events.  Returns a tuple (peak, seconds,
+    probes, event counts), or raises the exception the algorithm raised.
+    """
+
+    problem = peak.createProblem(matrix)
+    start = time.time()
+    function(problem)
+    seconds = time.time() - start
+
+    profiled = instrument.ProfiledPeakProblem(problem)
+    tracer = CountingTraceRecord()
+    location = function(profiled, trace = tracer)
+
+    return (location, seconds, profiled.profile.getCells(), tracer.counts)
+
+def runBenchmark(sizes = defaultSizes, seed = defaultSeed):
+    """
+    Runs every algorithm on every kind of matrix, with as many rows and
+    columns as each of the given sizes.  The random matrices of each size
+    only depend on the seed.  Returns one dictionary per run, with the keys
+    in columnNames.
+    """
+
+    results = []
+
+    for size in sizes:
+        for (matrixName, generator) in generatorList:
+            matrix = generator(size, size, random.Random((seed << 32) + size))
+            problem = peak.createProblem(matrix)
+
+            for (name, function, levelEvent) in algorithmList:
+                result = {"matrix" : matrixName, "rows" : size, "cols" : size,
+                          "algorithm" : name, "seconds" : "", "probes" : "",
+                          "depth" : ""}
+                try:
+                    (location, seconds, probes, counts) = \
+                        runAlgorithm(function, matrix)
+                except RuntimeError:
+                    # RecursionError is a RuntimeError
+                    result["status"] = "recursion limit"
+                    results.append(result)
+                    continue
+                except Exception as error:
+                    result["status"] = "error: %s" % type(error).__name__
+                    results.append(result)
+                    continue
+
+                result["status"] = "peak"
+                if location is None or not problem.isPeak(location):
+                    result["status"] = "NOT a peak"
+                result["seconds"] = "%.6f" % seconds
+                result["probes"] = probes
+                result["depth"] = counts.get(levelEvent, 0) + 1
+                results.append(result)
+
+    return results
+
+def formatTable(results):
+    """
+    Formats benchmark results as a table with aligned columns.
+    """
+
+    rows = [columnNames] + [[str(result[name]) for name in columnNames]
+                            for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columnNames))]
+    return "".join("  ".join(value.ljust(width) for (value, width)
+                             in zip(row, widths)).rstrip() + "\n"
+                   for row in rows)
+
+def formatCSV(results):
+    """
+    Formats benchmark results as comma-separated values, with a header line.
+    """
+
+    lines = [",".join(columnNames)]
+    for result in results:
+        lines.append(",".join(str(result[name]) for name in columnNames))
+    return "\n".join(lines) + "\n"
+
+def main():
+    """
+    Command line entry point:
+
+        python benchmark.py [<csv file> [<size> ...]]
+
+    Prints a table of the results, and also writes them as CSV to the given
+    file, if any.
+    """
+
+    filename = None
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+
+    sizes = defaultSizes
+    if len(sys.argv) > 2:
+        sizes = [int(size) for size in sys.argv[2:]]
+
+    results = runBenchmark(sizes)
+    sys.stdout.write(formatTable(results))
+
+    if filename is not None:
+        with open(filename, "w") as outputFile:
+            outputFile.write(formatCSV(results))
+
+if __name__ == "__main__":
+    main()
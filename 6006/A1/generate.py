@@ -1,14 +1,25 @@
+import array
+import binascii
+import itertools
+import multiprocessing
+import operator
 import os
 import sys
 import random
 import pprint
+import matrixfile
 import utils
 
-def randomProblem(rows = 10, columns = 10, max = 1000):
+# The number of cells generated (and written) together in each block by
+# writeRandomMatrix.
+BLOCK_CELLS = 1 << 20
+
+def randomProblem(rows = 10, columns = 10, max = 1000, rng = random):
     """
     Generate a random matrix, with the specified number of rows and
     columns.  Each number is distributed uniformly at random between
-    zero and the specified maximum.
+    zero and the specified maximum, and is drawn from rng (a seeded
+    random.Random gives the same matrix every time).
     """
 
     result = []
@@ -17,12 +28,185 @@ def randomProblem(rows = 10, columns = 10, max = 1000):
         resultRow = []
 
         for j in range(columns):
-            resultRow.append(random.randint(0, max))
+            resultRow.append(rng.randint(0, max))
 
         result.append(resultRow)
 
     return result
 
+def randomBlock(seed, block, count, max = 1000, typecode = "l"):
+    """
+    Generate the given block of count random numbers between zero and the
+    specified maximum, as an array.array.  The numbers only depend on the seed
+    and the block number, so any block can be generated on its own.
+
+    The random bits for the whole block are drawn with a single call to
+    getrandbits(), and reduced modulo max + 1 with map(), so no Python code
+    runs per number.  For maximums much smaller than 2 ** 32 (or 2 ** 64), the
+    bias of the modulo is negligible.  The numbers are the same on Python 2
+    and 3.
+    """
+
+    # integer seeds are used the same way by Python 2 and 3, strings aren't
+    rng = random.Random((seed << 64) + block)
+    width = 4 if max < (1 << 32) else 8
+    if count == 0:
+        return array.array(typecode)
+
+    # an unsigned type code of the right width ("Q" is missing on Python 2)
+    for code in "ILQ":
+        try:
+            raw = array.array(code)
+        except ValueError:
+            continue
+        if raw.itemsize == width:
+            break
+
+    # the bits as little-endian bytes; int.to_bytes is missing on Python 2
+    bits = rng.getrandbits(8 * width * count)
+    data = binascii.unhexlify("%0*x" % (2 * width * count, bits))[::-1]
+    if hasattr(raw, "frombytes"):
+        raw.frombytes(data)
+    else:
+        raw.fromstring(data)
+    if sys.byteorder != "little":
+        raw.byteswap()
+
+    return array.array(typecode, map(operator.mod, raw,
+                                     itertools.repeat(max + 1, count)))
+
+def writeBlock(job):
+    """
+    Generates one block of the matrix written by writeRandomMatrix, and
+    writes it at its place in the file.  Runs in a worker process.
+    """
+
+    (filename, seed, block, offset, count, max, typecode) = job
+    values = randomBlock(seed, block, count, max, typecode)
+    with open(filename, "r+b") as outputFile:
+        outputFile.seek(matrixfile.HEADER.size + offset * values.itemsize)
+        values.tofile(outputFile)
+
+def writeRandomMatrix(filename, rows = 10, columns = 10, max = 1000,
+                      seed = 0, processes = None, typecode = "l"):
+    """
+    Write a random matrix, with the specified number of rows and columns, to
+    a binary matrix file, without building it in memory.  Each number is
+    distributed uniformly at random between zero and the specified maximum.
+
+    The matrix is generated in blocks of BLOCK_CELLS numbers, by a pool of
+    worker processes (one per core by default) that each write their blocks
+    straight into the file.  The blocks do not depend on the number of
+    processes, so the same seed always gives the same file.
+    """
+
+    cells = rows * columns
+    itemsize = array.array(typecode).itemsize
+
+    with open(filename, "wb") as outputFile:
+        matrixfile.writeHeader(outputFile, typecode, rows, columns)
+        outputFile.truncate(matrixfile.HEADER.size + cells * itemsize)
+
+    jobs = [(filename, seed, block, offset,
+             min(BLOCK_CELLS, cells - offset), max, typecode)
+            for (block, offset) in enumerate(range(0, cells, BLOCK_CELLS))]
+
+    if processes == 1 or len(jobs) <= 1:
+        for job in jobs:
+            writeBlock(job)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        pool.map(writeBlock, jobs, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+def snakeProblem(rows = 10, columns = 10):
+    """
+    Generate a matrix containing a single ascending path that snakes back and
+    forth across every other row, with zeros everywhere else.  The only peak
+    is at the end of the path, and a greedy climb from the top left corner
+    walks along all of it, taking about rows * columns / 2 steps.
+    """
+
+    result = [[0] * columns for i in range(rows)]
+    value = 0
+
+    for i in range(0, rows, 2):
+        cols = range(columns) if (i // 2) % 2 == 0 else reversed(range(columns))
+        for j in cols:
+            value += 1
+            result[i][j] = value
+
+        # connect this row to the next path row through the row in between
+        if i + 2 < rows:
+            value += 1
+            result[i + 1][j] = value
+
+    return result
+
+def spiralProblem(rows = 10, columns = 10):
+    """
+    Generate a matrix containing a single ascending path that spirals inwards
+    from the top left corner, keeping a wall of zeros between successive
+    turns.  The only peak is at the center end of the path.
+    """
+
+    result = [[0] * columns for i in range(rows)]
+    if rows <= 0 or columns <= 0:
+        return result
+
+    def isFree(r, c, fromR, fromC):
+        # a cell can join the path if it is inside the matrix, unused, and
+        # touches no path cell other than the one we are coming from
+        if not (0 <= r < rows and 0 <= c < columns) or result[r][c] != 0:
+            return False
+        for (nr, nc) in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if (nr, nc) == (fromR, fromC):
+                continue
+            if 0 <= nr < rows and 0 <= nc < columns and result[nr][nc] != 0:
+                return False
+        return True
+
+    directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    (r, c, d, value) = (0, 0, 0, 1)
+    result[r][c] = value
+
+    while True:
+        for turn in range(2):
+            (dr, dc) = directions[(d + turn) % 4]
+            if isFree(r + dr, c + dc, r, c):
+                d = (d + turn) % 4
+                break
+        else:
+            return result
+
+        (r, c, value) = (r + dr, c + dc, value + 1)
+        result[r][c] = value
+
+def staircaseProblem(rows = 10, columns = 10):
+    """
+    Generate a matrix whose values increase by one with every step down or to
+    the right, so that its contour lines are staircases.  The only peak is
+    the bottom right corner, at the far end of every divide and conquer step.
+    """
+
+    return [[i + j for j in range(columns)] for i in range(rows)]
+
+def plateauProblem(rows = 10, columns = 10, max = 1000, rng = random):
+    """
+    Generate a matrix in which every cell has the same value, except for one
+    slightly higher cell at a location drawn from rng.  Every cell away from
+    the bump is a peak, and every maximum is a tie.
+    """
+
+    result = [[max - 1] * columns for i in range(rows)]
+    if rows > 0 and columns > 0:
+        result[rng.randrange(rows)][rng.randrange(columns)] = max
+    return result
+
 def main():
     filename = None
     if len(sys.argv) > 1:
@@ -35,15 +219,30 @@ def main():
     maximum = rows * cols * 2
     if len(sys.argv) > 4:
         maximum = int(sys.argv[4])
-    
-    generated = randomProblem(rows, cols, maximum)
 
-    print("Generated a matrix with %d row and %d columns." % (rows, cols))
     if filename is None:
         filename = utils.getSaveFilename("problem.py")
         if filename is None:
             return
 
+    # binary matrix files are generated in parallel, straight into the file
+    if filename.endswith(matrixfile.EXTENSION):
+        seed = random.randrange(1 << 32)
+        if len(sys.argv) > 5:
+            seed = int(sys.argv[5])
+        processes = None
+        if len(sys.argv) > 6:
+            processes = int(sys.argv[6])
+
+        writeRandomMatrix(filename, rows, cols, maximum, seed, processes)
+        print("Generated a matrix with %d row and %d columns, with seed %d." %
+              (rows, cols, seed))
+        return
+    
+    generated = randomProblem(rows, cols, maximum)
+
+    print("Generated a matrix with %d row and %d columns." % (rows, cols))
+
     with open(filename, "w") as outputFile:
         outputFile.write("problemMatrix = ")
         pprint.pprint(generated, outputFile)
@@ -0,0 +1,207 @@
+import json
+import sys
+import timeit
+import algorithms
+import main
+import peak
+
+################################################################################
+########################## Profiling Peak Problems #############################
+################################################################################
+
+# The instrumentation is a wrapper around a PeakProblem, so it costs nothing
+# unless a problem is explicitly wrapped: the algorithms and the PeakProblem
+# classes themselves are not changed.
+
+timer = timeit.default_timer
+
+class Profile(object):
+    """
+    The costs recorded while an algorithm runs on a ProfiledPeakProblem,
+    broken down by recursion level.  For every level, it records how many
+    times each PeakProblem method was called, how many matrix cells those
+    calls read, and how many seconds were spent in them.
+    """
+
+    def __init__(self):
+        """
+        Initialize the profile to empty.
+
+        RUNTIME: O(1)
+        """
+
+        self.levels = []
+
+    def add(self, level, name, cells, seconds):
+        """
+        Records one call of the named method at the given recursion level.
+
+        RUNTIME: O(1), amortized
+        """
+
+        while len(self.levels) <= level:
+            self.levels.append({"calls" : {}, "cells" : 0, "seconds" : 0.0})
+
+        stats = self.levels[level]
+        stats["calls"][name] = stats["calls"].get(name, 0) + 1
+        stats["cells"] += cells
+        stats["seconds"] += seconds
+
+    def getCells(self):
+        """
+        Returns the total number of cells read, over all levels.
+
+        RUNTIME: O(len(levels))
+        """
+
+        return sum(stats["cells"] for stats in self.levels)
+
+    def asJSON(self):
+        """
+        Returns the profile as a dictionary that obeys the JSON format, with
+        the totals over all levels and the statistics of each level.
+
+        RUNTIME: O(len(levels))
+        """
+
+        calls = {}
+        for stats in self.levels:
+            for (name, count) in stats["calls"].items():
+                calls[name] = calls.get(name, 0) + count
+
+        return {
+            "depth" : len(self.levels),
+            "calls" : calls,
+            "cells" : self.getCells(),
+            "seconds" : sum(stats["seconds"] for stats in self.levels),
+            "levels" : [dict(stats, level = level)
+                        for (level, stats) in enumerate(self.levels)]
+        }
+
+class ProfiledPeakProblem(peak.PeakProblem):
+    """
+    A wrapper around a PeakProblem of any kind, which records the cost of
+    every call made on it, and on its subproblems, into a shared Profile.
+    A subproblem is one recursion level deeper than its parent, and so is a
+    problem moved in place with setBounds(), as done by iterative.py.
+    """
+
+    def __init__(self, problem, profile = None, level = 0):
+        """
+        Wraps the given problem, recording into the given profile (or into a
+        new one) at the given recursion level.
+
+        RUNTIME: O(1)
+        """
+
+        peak.PeakProblem.__init__(self, problem.array, problem.bounds)
+        self.problem = problem
+        self.profile = profile if profile is not None else Profile()
+        self.level = level
+
+    def get(self, location):
+        start = timer()
+        value = self.problem.get(location)
+        self.profile.add(self.level, "get", 1, timer() - start)
+        return value
+
+    def getBetterNeighbor(self, location, trace = None):
+        start = timer()
+        best = self.problem.getBetterNeighbor(location, trace)
+        (r, c) = location
+        cells = (1 + (r - 1 >= 0) + (c - 1 >= 0) + (r + 1 < self.numRow) +
+                 (c + 1 < self.numCol))
+        self.profile.add(self.level, "getBetterNeighbor", cells,
+                         timer() - start)
+        return best
+
+    def getMaximum(self, locations, trace = None):
+        start = timer()
+        best = self.problem.getMaximum(locations, trace)
+        self.profile.add(self.level, "getMaximum", len(locations),
+                         timer() - start)
+        return best
+
+    def getRowMaximum(self, row, trace = None):
+        start = timer()
+        best = self.problem.getRowMaximum(row, trace)
+        self.profile.add(self.level, "getRowMaximum", self.numCol,
+                         timer() - start)
+        return best
+
+    def getColumnMaximum(self, col, trace = None):
+        start = timer()
+        best = self.problem.getColumnMaximum(col, trace)
+        self.profile.add(self.level, "getColumnMaximum", self.numRow,
+                         timer() - start)
+        return best
+
+    def getCrossMaximum(self, row, col, trace = None):
+        start = timer()
+        best = self.problem.getCrossMaximum(row, col, trace)
+        self.profile.add(self.level, "getCrossMaximum",
+                         self.numRow + self.numCol, timer() - start)
+        return best
+
+    def getRow(self, row):
+        start = timer()
+        values = self.problem.getRow(row)
+        self.profile.add(self.level, "getRow", self.numCol, timer() - start)
+        return values
+
+    def set(self, location, value):
+        self.problem.set(location, value)
+
+    def toList(self):
+        return self.problem.toList()
+
+    def iterRows(self):
+        return self.problem.iterRows()
+
+    def setBounds(self, bounds):
+        peak.PeakProblem.setBounds(self, bounds)
+        self.problem.setBounds(bounds)
+        self.level += 1
+
+    def getSubproblem(self, bounds):
+        return ProfiledPeakProblem(self.problem.getSubproblem(bounds),
+                                   self.profile, self.level + 1)
+
+def profileAlgorithm(function, problem):
+    """
+    Runs an algorithm on a wrapped copy of the given problem, and returns a
+    tuple (peak, profile).
+    """
+
+    profiled = ProfiledPeakProblem(problem)
+    location = function(profiled)
+    return (location, profiled.profile)
+
+def profileMain():
+    """
+    Command line entry point, printing the profile of every algorithm in
+    algorithms.py on a problem file as JSON:
+
+        python instrument.py [<filename>]
+    """
+
+    filename = "problem.py"
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+
+    algorithmList = [("algorithm1", algorithms.algorithm1),
+                     ("algorithm2", algorithms.algorithm2),
+                     ("algorithm3", algorithms.algorithm3),
+                     ("algorithm4", algorithms.algorithm4)]
+
+    profiles = {}
+    with main.loadProblem(filename) as problem:
+        for (name, function) in algorithmList:
+            (location, profile) = profileAlgorithm(function, problem)
+            profiles[name] = dict(profile.asJSON(), peak = location)
+
+    json.dump(profiles, sys.stdout, indent = 2, sort_keys = True)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    profileMain()
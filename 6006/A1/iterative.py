@@ -0,0 +1,135 @@
+################################################################################
+############################# Iterative Algorithms #############################
+################################################################################
+
+# Loop-based versions of the algorithms in algorithms.py.  Each one returns
+# exactly the same peak as the recursive version, and records exactly the same
+# trace, but instead of building a new PeakProblem and a list of subproblem
+# bounds for every level of the recursion, it moves a single view of the
+# problem in place using setBounds().  The dividing rows and columns are
+# scanned with getRowMaximum() and getColumnMaximum(), so no lists of
+# locations are built either.  Since nothing recurses, the height of the
+# matrix is not limited by Python's recursion limit.
+
+def algorithm1(problem, trace = None):
+    view = problem.getSubproblem((0, 0, problem.numRow, problem.numCol))
+
+    while view.numRow > 0 and view.numCol > 0:
+        # find the maximum in the dividing column
+        mid = view.numCol // 2
+        bestLoc = view.getColumnMaximum(mid, trace)
+        neighbor = view.getBetterNeighbor(bestLoc, trace)
+
+        # this is a peak, so return it
+        if neighbor == bestLoc:
+            if not trace is None: trace.foundPeak(bestLoc)
+            return problem.getLocationInSelf(view, bestLoc)
+
+        # otherwise, move to the half that contains the neighbor
+        (row, col) = neighbor
+        if col < mid:
+            view.setBounds((view.startRow, view.startCol, view.numRow, mid))
+        elif col > mid:
+            view.setBounds((view.startRow, view.startCol + mid + 1,
+                            view.numRow, view.numCol - (mid + 1)))
+        if not trace is None: trace.setProblemDimensions(view)
+
+    return None
+
+def algorithm2(problem, location = (0, 0), trace = None):
+    # if it's empty, we're done
+    if problem.numRow <= 0 or problem.numCol <= 0:
+        return None
+
+    # keep moving to a better neighbor until there isn't one
+    nextLocation = problem.getBetterNeighbor(location, trace)
+    while nextLocation != location:
+        location = nextLocation
+        nextLocation = problem.getBetterNeighbor(location, trace)
+
+    if not trace is None: trace.foundPeak(location)
+    return location
+
+def algorithm3(problem, bestSeen = None, trace = None):
+    view = problem.getSubproblem((0, 0, problem.numRow, problem.numCol))
+
+    while view.numRow > 0 and view.numCol > 0:
+        midRow = view.numRow // 2
+        midCol = view.numCol // 2
+
+        # find the best location on the cross (the middle row combined with
+        # the middle column)
+        crossLoc = view.getCrossMaximum(midRow, midCol, trace)
+        neighbor = view.getBetterNeighbor(crossLoc, trace)
+
+        # update the best we've seen so far based on this new maximum
+        if bestSeen is None or view.get(neighbor) > view.get(bestSeen):
+            bestSeen = neighbor
+            if not trace is None: trace.setBestSeen(bestSeen)
+
+        # return if we can't see any better neighbors
+        if neighbor == crossLoc:
+            if not trace is None: trace.foundPeak(crossLoc)
+            return problem.getLocationInSelf(view, crossLoc)
+
+        # move to the quadrant that contains the largest number we've seen so
+        # far; if it is on the cross, stay in the same problem
+        (row, col) = bestSeen
+        if row != midRow and col != midCol:
+            (startRow, numRow) = (0, midRow)
+            (startCol, numCol) = (0, midCol)
+            if row > midRow:
+                (startRow, numRow) = (midRow + 1, view.numRow - (midRow + 1))
+            if col > midCol:
+                (startCol, numCol) = (midCol + 1, view.numCol - (midCol + 1))
+            view.setBounds((view.startRow + startRow, view.startCol + startCol,
+                            numRow, numCol))
+            bestSeen = (row - startRow, col - startCol)
+        if not trace is None: trace.setProblemDimensions(view)
+
+    return None
+
+def algorithm4(problem, bestSeen = None, rowSplit = True, trace = None):
+    view = problem.getSubproblem((0, 0, problem.numRow, problem.numCol))
+
+    while view.numRow > 0 and view.numCol > 0:
+        # find the maximum in the dividing row or column
+        if rowSplit:
+            mid = view.numRow // 2
+            bestLoc = view.getRowMaximum(mid, trace)
+        else:
+            mid = view.numCol // 2
+            bestLoc = view.getColumnMaximum(mid, trace)
+
+        neighbor = view.getBetterNeighbor(bestLoc, trace)
+
+        # update the best we've seen so far based on this new maximum
+        if bestSeen is None or view.get(neighbor) > view.get(bestSeen):
+            bestSeen = neighbor
+            if not trace is None: trace.setBestSeen(bestSeen)
+
+        # return when we know we've found a peak
+        if neighbor == bestLoc and view.get(bestLoc) >= view.get(bestSeen):
+            if not trace is None: trace.foundPeak(bestLoc)
+            return problem.getLocationInSelf(view, bestLoc)
+
+        # move to the half that contains the largest number we've seen so
+        # far, alternating between splitting on rows and splitting on columns;
+        # if it is on the divider, stay in the same problem
+        (row, col) = bestSeen
+        if rowSplit and row < mid:
+            view.setBounds((view.startRow, view.startCol, mid, view.numCol))
+        elif rowSplit and row > mid:
+            view.setBounds((view.startRow + mid + 1, view.startCol,
+                            view.numRow - (mid + 1), view.numCol))
+            bestSeen = (row - (mid + 1), col)
+        elif not rowSplit and col < mid:
+            view.setBounds((view.startRow, view.startCol, view.numRow, mid))
+        elif not rowSplit and col > mid:
+            view.setBounds((view.startRow, view.startCol + mid + 1,
+                            view.numRow, view.numCol - (mid + 1)))
+            bestSeen = (row, col - (mid + 1))
+        if not trace is None: trace.setProblemDimensions(view)
+        rowSplit = not rowSplit
+
+    return None
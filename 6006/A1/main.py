@@ -2,7 +2,8 @@ import sys
 import peak
 import trace
 import algorithms
-import json
+import matrixfile
+import tiled
 import utils
 
 ################################################################################
@@ -12,8 +13,17 @@ import utils
 def loadProblem(file = "problem.py", variable = "problemMatrix"):
     """
     Loads a matrix from a python file, and constructs a PeakProblem from it.
+    Binary matrix files (as written by generate.py) are memory-mapped instead,
+    and tiled matrix files (as written by tiled.py) are read tile by tile;
+    both give an ArrayPeakProblem.  The problem should be closed once it is
+    no longer needed, in case it holds a file open.
     """
 
+    if matrixfile.isMatrixFile(file):
+        return matrixfile.openMatrix(file)
+    if tiled.isTiledFile(file):
+        return tiled.openTiled(file)
+
     namespace = dict()
     with open(file) as handle:
         exec(handle.read(), namespace)
@@ -32,34 +42,27 @@ def main():
                      ("Algorithm 3", algorithms.algorithm3),
                      ("Algorithm 4", algorithms.algorithm4)]
 
-    steps = []
     jumpOut=0   
-    for i in range(1):
-        problem = loadProblem(utils.getOpenFilename("problem.py"))
-        for (name, function) in algorithmList:
-            tracer = trace.TraceRecord()
-            peak = function(problem, trace = tracer)
-            steps.append(tracer.sequence)
-            status = "is NOT a peak (INCORRECT!)"
-            if problem.isPeak(peak):
-                status = "is a peak"
-            else:
-                print("Incorrect!\n")
-                print(name + " : " + str(peak) + " => " + status)
-                jumpOut=1
-
-        
-
-    # write the trace out to a file
-    with open("trace.jsonp", "w") as traceFile:
-        traceFile.write("parse(")
 
-        json.dump({
-            "input" : problem.array,
-            "steps" : steps
-        }, traceFile)
+    # write the traces out to a file as the algorithms run; the file is
+    # finished even if an algorithm fails, so that the visualizer can still
+    # show the traces up to the failure; the problem is closed at the end
+    with problem, open("trace.jsonp", "w") as traceFile:
+        writer = trace.TraceWriter(traceFile, problem)
 
-        traceFile.write(")")
+        try:
+            for (name, function) in algorithmList:
+                tracer = writer.newRecord()
+                peak = function(problem, trace = tracer)
+                status = "is NOT a peak (INCORRECT!)"
+                if problem.isPeak(peak):
+                    status = "is a peak"
+                else:
+                    print("Incorrect!\n")
+                    print(name + " : " + str(peak) + " => " + status)
+                    jumpOut=1
+        finally:
+            writer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+import array
+import mmap
+import struct
+import sys
+import peak
+
+################################################################################
+############################# Binary Matrix Files ##############################
+################################################################################
+
+# A binary matrix file is a fixed-size header followed by the matrix itself,
+# stored row by row in the machine representation of an array.array.  The
+# header records the magic number, the format version, the array.array type
+# code, the byte order and item size the file was written with, and the number
+# of rows and columns.
+
+MAGIC = b"PKMX"
+VERSION = 1
+HEADER = struct.Struct("<4sBccB8xQQ")
+EXTENSION = ".bin"
+
+def writeHeader(handle, typecode, rows, cols):
+    """
+    Writes the header of a binary matrix file to an open binary file handle.
+    The matrix itself must be written right after it, row by row.
+    """
+
+    itemsize = array.array(typecode).itemsize
+    byteorder = b"<" if sys.byteorder == "little" else b">"
+    handle.write(HEADER.pack(MAGIC, VERSION, typecode.encode("ascii"),
+                             byteorder, itemsize, rows, cols))
+
+def readHeader(handle):
+    """
+    Reads the header of a binary matrix file from an open binary file handle.
+    Returns a tuple (typecode, byteorder, itemsize, rows, cols).
+    """
+
+    data = handle.read(HEADER.size)
+    if len(data) != HEADER.size:
+        raise ValueError("Truncated matrix file header")
+    (magic, version, typecode, byteorder, itemsize, rows, cols) = \
+        HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binary matrix file")
+    if version != VERSION:
+        raise ValueError("Unsupported matrix file version %d" % version)
+    typecode = typecode.decode("ascii")
+    if array.array(typecode).itemsize != itemsize:
+        raise ValueError("Matrix file item size does not match this platform")
+    byteorder = "little" if byteorder == b"<" else "big"
+    return (typecode, byteorder, itemsize, rows, cols)
+
+def isMatrixFile(filename):
+    """
+    Returns true if the given file starts with the binary matrix file magic
+    number.
+    """
+
+    with open(filename, "rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+def writeMatrix(filename, matrix, typecode = "l"):
+    """
+    Writes a matrix, given as a list of rows of equal length, to a binary
+    matrix file.  Only one row is converted to an array.array at a time.
+    """
+
+    (rows, cols) = peak.getDimensions(matrix)
+    with open(filename, "wb") as handle:
+        writeHeader(handle, typecode, rows, cols)
+        for row in matrix:
+            if len(row) != cols:
+                raise ValueError("All rows must have the same length")
+            array.array(typecode, row).tofile(handle)
+
+class MappedMatrix(object):
+    """
+    The matrix of a memory-mapped binary matrix file, for versions of Python
+    whose memory views cannot be cast to another type (such as Python 2).  It
+    behaves like the flat, row-major buffer of an ArrayPeakProblem: it can be
+    indexed and sliced, and the cells are decoded from the mapping on demand,
+    so only the pages that are looked at are read from disk.
+    """
+
+    def __init__(self, mapping, typecode, count):
+        """
+        Wraps a mapping of a whole binary matrix file, whose matrix has count
+        cells of the given type, in the byte order of this machine.
+        """
+
+        self.mapping = mapping
+        self.typecode = typecode
+        self.itemsize = array.array(typecode).itemsize
+        self.count = count
+
+    def close(self):
+        """
+        Closes the mapping.
+        """
+
+        self.mapping.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """
+        Indexes the matrix as if it were a flat, row-major buffer.  Slices
+        must have a positive step, and are returned as array.arrays.
+        """
+
+        if not isinstance(index, slice):
+            if index < 0:
+                index += self.count
+            if not (0 <= index and index < self.count):
+                raise IndexError("Matrix index out of range")
+            return struct.unpack_from(self.typecode, self.mapping,
+                                      HEADER.size + index * self.itemsize)[0]
+
+        (start, stop, step) = index.indices(self.count)
+        count = len(range(start, stop, step))
+        values = array.array(self.typecode)
+        if count == 0:
+            return values
+        if step <= 0:
+            raise ValueError("Slices must have a positive step")
+
+        offset = HEADER.size + start * self.itemsize
+        if step == 1:
+            data = self.mapping[offset:offset + count * self.itemsize]
+            if hasattr(values, "frombytes"):
+                values.frombytes(data)
+            else:
+                values.fromstring(data)
+            return values
+
+        # one value, then the gap to the next one and that value, count - 1
+        # times, so that the values are decoded with a single call
+        gap = (step - 1) * self.itemsize
+        layout = self.typecode + ("%dx%s" % (gap, self.typecode)) * (count - 1)
+        values.extend(struct.unpack_from(layout, self.mapping, offset))
+        return values
+
+def openMatrix(filename):
+    """
+    Opens a binary matrix file as an ArrayPeakProblem.  The file is mapped
+    into memory rather than read, so the problem is ready immediately and
+    the pages of the matrix are only read from disk when an algorithm looks
+    at them.  The matrix is a cast memory view of the mapping, or a
+    MappedMatrix where memory views cannot be cast (Python 2).
+
+    Only if the file was written on a machine with a different byte order is
+    the matrix read into memory (and byte-swapped) instead, so such files
+    must fit in memory.
+    """
+
+    with open(filename, "rb") as handle:
+        (typecode, byteorder, itemsize, rows, cols) = readHeader(handle)
+        size = rows * cols * itemsize
+
+        if byteorder != sys.byteorder or size == 0:
+            buffer = array.array(typecode)
+            buffer.fromfile(handle, rows * cols)
+            if byteorder != sys.byteorder:
+                buffer.byteswap()
+        else:
+            mapping = mmap.mmap(handle.fileno(), 0, access = mmap.ACCESS_READ)
+            if len(mapping) < HEADER.size + size:
+                mapping.close()
+                raise ValueError("Truncated matrix file")
+            if hasattr(memoryview, "cast"):
+                view = memoryview(mapping)[HEADER.size:HEADER.size + size]
+                buffer = view.cast(typecode)
+            else:
+                buffer = MappedMatrix(mapping, typecode, rows * cols)
+
+    return peak.ArrayPeakProblem(buffer, cols, (0, 0, rows, cols))
@@ -0,0 +1,287 @@
+import array
+import itertools
+import operator
+import random
+import sys
+
+################################################################################
+###################### Class for N-Dimensional Peak Problems ###################
+################################################################################
+
+class NDPeakProblem(object):
+    """
+    An instance of a peak-finding problem in any number of dimensions, stored
+    in a flat, row-major buffer (an array.array, a list, or a memory view).
+    A location is a tuple with one coordinate per dimension, and its
+    neighbors are the 2d locations that differ by one in a single coordinate.
+    A peak is a location that is at least as big as all of its neighbors.
+    """
+
+    def __init__(self, array, shape, bounds):
+        """
+        A method for initializing an instance of the NDPeakProblem class.
+        Takes a flat row-major buffer, the size of each dimension of that
+        buffer, and an argument indicating which part of it to include: a pair
+        of tuples (starting coordinates, sizes).
+
+        RUNTIME: O(d)
+        """
+
+        (starts, sizes) = bounds
+
+        self.array = array
+        self.shape = tuple(shape)
+        self.bounds = bounds
+        self.starts = tuple(starts)
+        self.sizes = tuple(sizes)
+
+        # how far apart neighbors in each dimension are in the buffer
+        strides = [1] * len(self.shape)
+        for k in range(len(self.shape) - 2, -1, -1):
+            strides[k] = strides[k + 1] * self.shape[k + 1]
+        self.strides = tuple(strides)
+
+    def getIndex(self, location):
+        """
+        Returns the index in the buffer of the given location, offset by the
+        starting coordinates.
+
+        RUNTIME: O(d)
+        """
+
+        return sum((start + x) * stride for (start, x, stride)
+                   in zip(self.starts, location, self.strides))
+
+    def contains(self, location):
+        """
+        Returns true if the given location is inside the current problem.
+
+        RUNTIME: O(d)
+        """
+
+        return all(0 <= x and x < size for (x, size)
+                   in zip(location, self.sizes))
+
+    def get(self, location):
+        """
+        Returns the value of the buffer at the given location, offset by the
+        starting coordinates, or 0 outside of the current problem.
+
+        RUNTIME: O(d)
+        """
+
+        if not self.contains(location):
+            return 0
+        return self.array[self.getIndex(location)]
+
+    def getBetterNeighbor(self, location):
+        """
+        If the location has a better neighbor, return the neighbor.
+        Otherwise, return the location.  Like PeakProblem.getBetterNeighbor,
+        the neighbors below the location are examined first, in order of
+        dimension, followed by the neighbors above it.
+
+        RUNTIME: O(d^2)
+        """
+
+        best = tuple(location)
+        bestVal = self.get(best)
+
+        for step in (-1, 1):
+            for k in range(len(location)):
+                neighbor = list(location)
+                neighbor[k] += step
+                neighbor = tuple(neighbor)
+                if self.contains(neighbor) and self.get(neighbor) > bestVal:
+                    (best, bestVal) = (neighbor, self.get(neighbor))
+
+        return best
+
+    def isPeak(self, location):
+        """
+        Returns true if the given location is a peak in the current problem.
+
+        RUNTIME: O(d^2)
+        """
+
+        return self.getBetterNeighbor(location) == tuple(location)
+
+    def getStrip(self, start, stop, step):
+        """
+        Returns the slice [start:stop:step] of the underlying buffer.  Memory
+        views are copied out into an array.array.
+
+        RUNTIME: O((stop - start) / step)
+        """
+
+        values = self.array[start:stop:step]
+        if isinstance(values, memoryview):
+            values = array.array(values.format, values.tobytes())
+        return values
+
+    def getPlaneMaximum(self, dim, index):
+        """
+        Finds the location of the greatest value on the hyperplane of the
+        current problem where coordinate dim equals index.  The hyperplane is
+        read as (strided) slices of the buffer along one of its dimensions,
+        so only the cells on it are touched; ties go to the first slice.
+
+        RUNTIME: O(product of the sizes other than sizes[dim])
+        """
+
+        d = len(self.sizes)
+        if d == 1:
+            return (index,)
+
+        # read along the last dimension, unless that is the one being split
+        lineDim = d - 1 if dim != d - 1 else d - 2
+        otherDims = [k for k in range(d) if k != dim and k != lineDim]
+        (stride, length) = (self.strides[lineDim], self.sizes[lineDim])
+
+        (bestLoc, bestVal) = (None, 0)
+        location = [0] * d
+        location[dim] = index
+
+        for coords in itertools.product(*[range(self.sizes[k])
+                                          for k in otherDims]):
+            for (k, x) in zip(otherDims, coords):
+                location[k] = x
+            location[lineDim] = 0
+            start = self.getIndex(location)
+            values = self.getStrip(start, start + (length - 1) * stride + 1,
+                                   stride)
+            value = max(values)
+            if bestLoc is None or value > bestVal:
+                location[lineDim] = values.index(value)
+                (bestLoc, bestVal) = (tuple(location), value)
+
+        return bestLoc
+
+    def setBounds(self, bounds):
+        """
+        Moves this problem, in place, to the given bounds, in the coordinates
+        of the whole buffer.
+
+        RUNTIME: O(d)
+        """
+
+        (starts, sizes) = bounds
+        self.bounds = bounds
+        self.starts = tuple(starts)
+        self.sizes = tuple(sizes)
+
+    def getSubproblem(self, bounds):
+        """
+        Returns a subproblem with the given bounds, sharing this problem's
+        buffer.  The bounds is a pair of tuples (starting coordinates, sizes),
+        relative to the current problem.
+
+        RUNTIME: O(d)
+        """
+
+        (starts, sizes) = bounds
+        newStarts = tuple(map(operator.add, self.starts, starts))
+        return NDPeakProblem(self.array, self.shape, (newStarts, sizes))
+
+    def getLocationInSelf(self, problem, location):
+        """
+        Remaps the location in the given problem to the same location in
+        the problem that this function is being called from.
+
+        RUNTIME: O(d)
+        """
+
+        return tuple(x + theirs - mine for (x, theirs, mine)
+                     in zip(location, problem.starts, self.starts))
+
+################################################################################
+############################## Peak Finding ####################################
+################################################################################
+
+def algorithm(problem):
+    """
+    Finds a peak the way algorithm4 does, one hyperplane at a time: it splits
+    the current problem in half along its largest dimension, finds the
+    maximum on the dividing hyperplane, and moves to the half containing the
+    best value seen so far, unless the maximum is a peak.  Like the loops in
+    iterative.py, it moves a single view in place.
+
+    For a volume of n^d cells, only the split hyperplanes are read, and they
+    shrink geometrically, so this takes O(n^(d-1)) time.
+    """
+
+    d = len(problem.sizes)
+    view = problem.getSubproblem(((0,) * d, problem.sizes))
+    bestSeen = None
+
+    while all(size > 0 for size in view.sizes):
+        # split the largest dimension at its middle
+        dim = max(range(d), key = lambda k: view.sizes[k])
+        mid = view.sizes[dim] // 2
+        bestLoc = view.getPlaneMaximum(dim, mid)
+        neighbor = view.getBetterNeighbor(bestLoc)
+
+        # update the best we've seen so far based on this new maximum
+        if bestSeen is None or view.get(neighbor) > view.get(bestSeen):
+            bestSeen = neighbor
+
+        # return when we know we've found a peak
+        if neighbor == bestLoc and view.get(bestLoc) >= view.get(bestSeen):
+            return problem.getLocationInSelf(view, bestLoc)
+
+        # move to the half that contains the largest number we've seen so
+        # far; it is bigger than everything on the hyperplane, so it is never
+        # on the hyperplane itself
+        (starts, sizes) = (list(view.starts), list(view.sizes))
+        if bestSeen[dim] < mid:
+            sizes[dim] = mid
+        else:
+            starts[dim] += mid + 1
+            sizes[dim] -= mid + 1
+            bestSeen = list(bestSeen)
+            bestSeen[dim] -= mid + 1
+            bestSeen = tuple(bestSeen)
+        view.setBounds((tuple(starts), tuple(sizes)))
+
+    return None
+
+################################################################################
+################################ Helper Methods ################################
+################################################################################
+
+def createNDProblem(buffer, shape):
+    """
+    Constructs an instance of the NDPeakProblem object covering the whole of
+    the given flat, row-major buffer, whose dimensions are given by shape.
+
+    RUNTIME: O(d)
+    """
+
+    size = 1
+    for length in shape:
+        size *= length
+    if len(buffer) != size:
+        raise ValueError("The buffer does not hold %d values" % size)
+
+    return NDPeakProblem(buffer, shape, ((0,) * len(shape), tuple(shape)))
+
+def main():
+    """
+    Command line entry point, finding a peak in a volume of random values
+    stored in an array.array:
+
+        python ndpeak.py <size> [<size> ...]
+    """
+
+    shape = tuple(int(size) for size in sys.argv[1:]) or (64, 64, 64)
+    size = 1
+    for length in shape:
+        size *= length
+
+    buffer = array.array("l", (random.randint(0, 255) for i in range(size)))
+    problem = createNDProblem(buffer, shape)
+    location = algorithm(problem)
+    print("Found peak %s with value %d" % (location, problem.get(location)))
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import array
+import heapq
+import itertools
+import operator
 import trace
 
 ################################################################################
@@ -41,6 +45,39 @@ class PeakProblem(object):
             return 0
         return self.array[self.startRow + r][self.startCol + c]
 
+    def set(self, location, value):
+        """
+        Changes the value of the array at the given location, offset by the
+        coordinates (startRow, startCol).
+
+        RUNTIME: O(1)
+        """
+
+        (r, c) = location
+        if not (0 <= r and r < self.numRow and 0 <= c and c < self.numCol):
+            raise IndexError("Location is outside of the problem")
+        self.array[self.startRow + r][self.startCol + c] = value
+
+    def close(self):
+        """
+        Closes the file that the matrix is read from, if it is read from one
+        (see tiled.py).  Subproblems share the matrix, so they can't be used
+        afterwards either.
+
+        RUNTIME: O(1)
+        """
+
+        close = getattr(self.array, "close", None)
+        if not close is None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
     def getBetterNeighbor(self, location, trace = None):
         """
         If (r, c) has a better neighbor, return the neighbor.  Otherwise,
@@ -82,6 +119,62 @@ class PeakProblem(object):
 
         return bestLoc
 
+    def getRowMaximum(self, row, trace = None):
+        """
+        Finds the location of the greatest value in the given row of the
+        current problem.  Equivalent to calling getMaximum() on every location
+        in that row, in order.
+
+        RUNTIME: O(numCol)
+        """
+
+        values = self.array[self.startRow + row]
+        start = self.startCol
+        col = max(range(self.numCol), key = lambda c: values[start + c])
+        bestLoc = (row, col)
+
+        if not trace is None: trace.getRowMaximum(row, self.numCol, bestLoc)
+
+        return bestLoc
+
+    def getColumnMaximum(self, col, trace = None):
+        """
+        Finds the location of the greatest value in the given column of the
+        current problem.  Equivalent to calling getMaximum() on every location
+        in that column, in order.
+
+        RUNTIME: O(numRow)
+        """
+
+        (array, start, c) = (self.array, self.startRow, self.startCol + col)
+        row = max(range(self.numRow), key = lambda r: array[start + r][c])
+        bestLoc = (row, col)
+
+        if not trace is None:
+            trace.getColumnMaximum(col, self.numRow, bestLoc)
+
+        return bestLoc
+
+    def getCrossMaximum(self, row, col, trace = None):
+        """
+        Finds the location of the greatest value on the cross formed by the
+        given row and the given column.  Equivalent to calling getMaximum() on
+        every location in the row, followed by every location in the column.
+
+        RUNTIME: O(numRow + numCol)
+        """
+
+        rowLoc = self.getRowMaximum(row)
+        colLoc = self.getColumnMaximum(col)
+        bestLoc = rowLoc
+        if self.get(colLoc) > self.get(rowLoc):
+            bestLoc = colLoc
+
+        if not trace is None:
+            trace.getCrossMaximum(row, col, self.numRow, self.numCol, bestLoc)
+
+        return bestLoc
+
     def isPeak(self, location):
         """
         Returns true if the given location is a peak in the current subproblem.
@@ -91,6 +184,146 @@ class PeakProblem(object):
 
         return (self.getBetterNeighbor(location) == location)
 
+    def getRow(self, row):
+        """
+        Returns the values in the given row of the current problem.
+
+        RUNTIME: O(numCol)
+        """
+
+        start = self.startCol
+        return self.array[self.startRow + row][start:start + self.numCol]
+
+    def getRows(self, row, count):
+        """
+        Returns the values in count consecutive rows of the current problem,
+        starting at the given row, as one flat list in row-major order.
+
+        RUNTIME: O(count * numCol)
+        """
+
+        values = []
+        for r in range(row, row + count):
+            values.extend(self.getRow(r))
+        return values
+
+    def iterPeakRows(self, bandRows = 64):
+        """
+        Finds every peak in the current subproblem, one band of rows at a
+        time.  For each row, yields a tuple (row, values, peakColumns), where
+        values are the values in the row and peakColumns are the columns of
+        the peaks in it, in increasing order.
+
+        Each band of bandRows rows is read as one flat list, along with the
+        rows just above and below it, and compared as a whole with its copies
+        shifted by one cell left, right, up and down, which are built with
+        slices.  All four comparisons are made in a single pass over the band,
+        rather than by calling isPeak() on every cell.  A cell on the border
+        is compared with itself on that side.  Only one band is held at any
+        time.
+
+        RUNTIME: O(numRow * numCol)
+        """
+
+        (numRow, width) = (self.numRow, self.numCol)
+        if numRow <= 0 or width <= 0:
+            return
+
+        for start in range(0, numRow, bandRows):
+            count = min(bandRows, numRow - start)
+            size = count * width
+
+            # the band, with the rows around it when there are any
+            first = max(start - 1, 0)
+            last = min(start + count + 1, numRow)
+            rows = self.getRows(first, last - first)
+            offset = (start - first) * width
+            band = rows[offset:offset + size]
+
+            left = band[:1] + band[:-1]
+            left[::width] = band[::width]
+            right = band[1:] + band[-1:]
+            right[width - 1::width] = band[width - 1::width]
+            if offset > 0:
+                up = rows[offset - width:offset + size - width]
+            else:
+                up = band[:width] + band[:size - width]
+            if offset + size < len(rows):
+                down = rows[offset + width:offset + size + width]
+            else:
+                down = band[width:] + band[size - width:]
+
+            # one pass over the band and its four shifted copies
+            mask = [x >= a and x >= b and x >= c and x >= d
+                    for (x, a, b, c, d) in zip(band, left, right, up, down)]
+
+            for r in range(count):
+                (begin, end) = (r * width, (r + 1) * width)
+                yield (start + r, band[begin:end],
+                       list(itertools.compress(range(width),
+                                               mask[begin:end])))
+
+    def allPeaks(self):
+        """
+        Returns a list of every peak in the current subproblem, in row-major
+        order.
+
+        RUNTIME: O(numRow * numCol)
+        """
+
+        return [(r, c) for (r, values, columns) in self.iterPeakRows()
+                for c in columns]
+
+    def topKPeaks(self, k):
+        """
+        Returns the locations of the k highest peaks in the current
+        subproblem, highest first.  Peaks of equal height are returned in
+        row-major order.  Only k peaks are kept at any time, in a heap.
+
+        RUNTIME: O(numRow * numCol * log(k))
+        """
+
+        peaks = ((values[c], (r, c)) for (r, values, columns)
+                 in self.iterPeakRows() for c in columns)
+        best = heapq.nlargest(k, peaks, key = operator.itemgetter(0))
+        return [location for (value, location) in best]
+
+    def toList(self):
+        """
+        Returns the whole underlying matrix as a list of lists, for example to
+        export it to the visualizer.
+
+        RUNTIME: O(1)
+        """
+
+        return self.array
+
+    def iterRows(self):
+        """
+        Iterates over the rows of the whole underlying matrix, as lists.
+
+        RUNTIME: O(1) per row
+        """
+
+        return iter(self.array)
+
+    def setBounds(self, bounds):
+        """
+        Moves this problem, in place, to the given bounds.  Unlike the bounds
+        given to getSubproblem(), these are in the coordinates of the whole
+        array, like the bounds given to the constructor.
+
+        RUNTIME: O(1)
+        """
+
+        (startRow, startCol, numRow, numCol) = bounds
+
+        self.bounds = bounds
+        self.startRow = startRow
+        self.startCol = startCol
+        self.numRow = numRow
+        self.numCol = numCol
+
     def getSubproblem(self, bounds):
         """
         Returns a subproblem with the given bounds.  The bounds is a quadruple
@@ -134,6 +367,210 @@ class PeakProblem(object):
         newCol = col + problem.startCol - self.startCol
         return (newRow, newCol)
 
+################################################################################
+##################### Class for Array-Backed Peak Problems #####################
+################################################################################
+
+class ArrayPeakProblem(PeakProblem):
+    """
+    A peak-finding problem stored in a flat, row-major buffer (an array.array,
+    or a memory view of a binary matrix file) instead of a list of lists.
+    Every row and column of the buffer is a (strided) slice, so the maximum
+    of a dividing row or column is found with a single slice and a single
+    call to max(), without touching the cells one at a time from Python.
+
+    The results of every method are identical to those of PeakProblem.
+    """
+
+    def __init__(self, array, width, bounds):
+        """
+        A method for initializing an instance of the ArrayPeakProblem class.
+        Takes a flat row-major buffer, the number of columns in each row of
+        that buffer, and an argument indicating which rows to include.
+
+        RUNTIME: O(1)
+        """
+
+        PeakProblem.__init__(self, array, bounds)
+        self.width = width
+
+    def get(self, location):
+        """
+        Returns the value of the array at the given location, offset by
+        the coordinates (startRow, startCol).
+
+        RUNTIME: O(1)
+        """
+
+        (r, c) = location
+        if not (0 <= r and r < self.numRow):
+            return 0
+        if not (0 <= c and c < self.numCol):
+            return 0
+        return self.array[(self.startRow + r) * self.width + self.startCol + c]
+
+    def set(self, location, value):
+        """
+        Changes the value of the array at the given location, offset by the
+        coordinates (startRow, startCol).  The buffer must be writable.
+
+        RUNTIME: O(1)
+        """
+
+        (r, c) = location
+        if not (0 <= r and r < self.numRow and 0 <= c and c < self.numCol):
+            raise IndexError("Location is outside of the problem")
+        index = (self.startRow + r) * self.width + self.startCol + c
+        self.array[index] = value
+
+    def getBetterNeighbor(self, location, trace = None):
+        """
+        If (r, c) has a better neighbor, return the neighbor.  Otherwise,
+        return the location (r, c).  The neighbors are examined in the same
+        order as in PeakProblem.getBetterNeighbor.
+
+        RUNTIME: O(1)
+        """
+
+        (r, c) = location
+        best = location
+        bestVal = self.get(location)
+
+        array = self.array
+        width = self.width
+        index = (self.startRow + r) * width + self.startCol + c
+
+        if r - 1 >= 0 and array[index - width] > bestVal:
+            (best, bestVal) = ((r - 1, c), array[index - width])
+        if c - 1 >= 0 and array[index - 1] > bestVal:
+            (best, bestVal) = ((r, c - 1), array[index - 1])
+        if r + 1 < self.numRow and array[index + width] > bestVal:
+            (best, bestVal) = ((r + 1, c), array[index + width])
+        if c + 1 < self.numCol and array[index + 1] > bestVal:
+            (best, bestVal) = ((r, c + 1), array[index + 1])
+
+        if not trace is None: trace.getBetterNeighbor(location, best)
+
+        return best
+
+    def getRow(self, row):
+        """
+        Returns the values in the given row of the current problem, as a
+        slice of the underlying buffer.
+
+        RUNTIME: O(numCol)
+        """
+
+        start = (self.startRow + row) * self.width + self.startCol
+        return self.getStrip(start, start + self.numCol, 1)
+
+    def getRows(self, row, count):
+        """
+        Returns the values in count consecutive rows of the current problem,
+        starting at the given row, as one flat list in row-major order.  If
+        the problem spans the whole width of the buffer, the rows are read
+        as a single slice.
+
+        RUNTIME: O(count * numCol)
+        """
+
+        if self.numCol != self.width:
+            return PeakProblem.getRows(self, row, count)
+        start = (self.startRow + row) * self.width
+        return list(self.getStrip(start, start + count * self.width, 1))
+
+    def getColumn(self, col):
+        """
+        Returns the values in the given column of the current problem, as a
+        strided slice of the underlying buffer.
+
+        RUNTIME: O(numRow)
+        """
+
+        start = self.startRow * self.width + self.startCol + col
+        stop = start + (self.numRow - 1) * self.width + 1
+        return self.getStrip(start, stop, self.width)
+
+    def getStrip(self, start, stop, step):
+        """
+        Returns the slice [start:stop:step] of the underlying buffer as an
+        array.array.  Buffers that are memory views (such as memory-mapped
+        matrix files) are copied out, touching only the pages in the slice.
+
+        RUNTIME: O((stop - start) / step)
+        """
+
+        values = self.array[start:stop:step]
+        if isinstance(values, memoryview):
+            values = array.array(values.format, values.tobytes())
+        return values
+
+    def getRowMaximum(self, row, trace = None):
+        """
+        Finds the location of the greatest value in the given row of the
+        current problem, using one slice of the buffer.
+
+        RUNTIME: O(numCol)
+        """
+
+        values = self.getRow(row)
+        bestLoc = (row, values.index(max(values)))
+
+        if not trace is None: trace.getRowMaximum(row, self.numCol, bestLoc)
+
+        return bestLoc
+
+    def getColumnMaximum(self, col, trace = None):
+        """
+        Finds the location of the greatest value in the given column of the
+        current problem, using one strided slice of the buffer.
+
+        RUNTIME: O(numRow)
+        """
+
+        values = self.getColumn(col)
+        bestLoc = (values.index(max(values)), col)
+
+        if not trace is None:
+            trace.getColumnMaximum(col, self.numRow, bestLoc)
+
+        return bestLoc
+
+    def getSubproblem(self, bounds):
+        """
+        Returns a subproblem with the given bounds, sharing this problem's
+        buffer.  The bounds is a quadruple of numbers: (starting row, starting
+        column, # of rows, # of columns).
+
+        RUNTIME: O(1)
+        """
+
+        (sRow, sCol, nRow, nCol) = bounds
+        newBounds = (self.startRow + sRow, self.startCol + sCol, nRow, nCol)
+        return ArrayPeakProblem(self.array, self.width, newBounds)
+
+    def toList(self):
+        """
+        Returns the whole underlying matrix as a list of lists, for example to
+        export it to the visualizer.
+
+        RUNTIME: O(len(array))
+        """
+
+        return list(self.iterRows())
+
+    def iterRows(self):
+        """
+        Iterates over the rows of the whole underlying matrix, as lists.  Only
+        one row is copied out of the buffer at a time.
+
+        RUNTIME: O(width) per row
+        """
+
+        rows = len(self.array) // self.width if self.width > 0 else 0
+        for r in range(rows):
+            yield self.array[r * self.width:(r + 1) * self.width].tolist()
+
 ################################################################################
 ################################ Helper Methods ################################
 ################################################################################
@@ -168,3 +605,20 @@ def createProblem(array):
 
     (rows, cols) = getDimensions(array)
     return PeakProblem(array, (0, 0, rows, cols))
+
+def createArrayProblem(matrix, typecode = "l"):
+    """
+    Constructs an instance of the ArrayPeakProblem object for the given list
+    of lists, copying it into a flat array.array with the given type code.
+    Every row must have the same length.
+
+    RUNTIME: O(rows * cols)
+    """
+
+    (rows, cols) = getDimensions(matrix)
+    buffer = array.array(typecode)
+    for row in matrix:
+        if len(row) != cols:
+            raise ValueError("All rows must have the same length")
+        buffer.extend(row)
+    return ArrayPeakProblem(buffer, cols, (0, 0, rows, cols))
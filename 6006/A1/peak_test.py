@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+import json
+import mmap
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import algorithms
+import batch
+import generate
+import instrument
+import iterative
+import matrixfile
+import ndpeak
+import peak
+import rangemax
+import tiled
+import trace
+import tracker
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+################################################################################
+################################## Peak Tests ##################################
+################################################################################
+
+def randomMatrix(rng, rows, cols, maximum):
+    """
+    Returns a rows x cols list of lists of random values in [0, maximum).
+    """
+
+    return [[rng.randrange(maximum) for c in range(cols)]
+            for r in range(rows)]
+
+def bruteForcePeaks(matrix):
+    """
+    Returns every peak of a list of lists, in row-major order, by calling
+    isPeak() on every cell.
+    """
+
+    problem = peak.createProblem(matrix)
+    return [(r, c) for r in range(problem.numRow)
+            for c in range(problem.numCol) if problem.isPeak((r, c))]
+
+# Pairs of (recursive, loop-based) versions of each algorithm.
+algorithmPairs = [(algorithms.algorithm1, iterative.algorithm1),
+                  (algorithms.algorithm2, iterative.algorithm2),
+                  (algorithms.algorithm3, iterative.algorithm3),
+                  (algorithms.algorithm4, iterative.algorithm4)]
+
+# Matrix sizes to run the algorithms on, including empty and degenerate ones.
+matrixSizes = [(0, 0), (1, 1), (1, 9), (9, 1), (2, 2), (7, 5), (16, 16),
+               (23, 40), (40, 23)]
+
+class PeakTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(6006)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def openBackends(self, matrix):
+        """
+        Returns a list of (name, problem) pairs, one for every kind of problem
+        that can hold the given matrix.  Problems that hold a file open are
+        closed when the test ends.
+        """
+
+        backends = [("list", peak.createProblem(matrix)),
+                    ("array", peak.createArrayProblem(matrix))]
+        if len(matrix) == 0:
+            return backends
+
+        (rows, cols) = (len(matrix), len(matrix[0]))
+        filename = os.path.join(self.directory, "backend" +
+                                matrixfile.EXTENSION)
+        matrixfile.writeMatrix(filename, matrix)
+        backends.append(("matrixfile", matrixfile.openMatrix(filename)))
+
+        # the buffer openMatrix uses when memory views can't be cast
+        with open(filename, "rb") as handle:
+            mapping = mmap.mmap(handle.fileno(), 0, access = mmap.ACCESS_READ)
+        buffer = matrixfile.MappedMatrix(mapping, "l", rows * cols)
+        backends.append(("mapped", peak.ArrayPeakProblem(buffer, cols,
+                                                         (0, 0, rows, cols))))
+
+        filename = os.path.join(self.directory, "backend" + tiled.EXTENSION)
+        tiled.writeTiled(filename, peak.createProblem(matrix), 4, 8)
+        backends.append(("tiled", tiled.openTiled(filename, 3)))
+
+        backends.append(("indexed", rangemax.createIndexedProblem(
+            peak.createProblem(matrix))))
+        backends.append(("profiled", instrument.ProfiledPeakProblem(
+            peak.createArrayProblem(matrix))))
+
+        for (name, problem) in backends:
+            self.addCleanup(problem.close)
+        return backends
+
+    def testAlgorithms(self):
+        for (rows, cols) in matrixSizes:
+            for maximum in [3, 1000]:
+                matrix = randomMatrix(self.rng, rows, cols, maximum)
+                expected = [recursive(peak.createProblem(matrix))
+                            for (recursive, loop) in algorithmPairs]
+                for (name, problem) in self.openBackends(matrix):
+                    for (i, (recursive, loop)) in enumerate(algorithmPairs):
+                        message = "%s, algorithm%d, %dx%d" % (name, i + 1,
+                                                              rows, cols)
+                        self.assertEqual(expected[i], recursive(problem),
+                                         message)
+                        self.assertEqual(expected[i], loop(problem), message)
+                        if rows == 0:
+                            self.assertEqual(None, expected[i], message)
+                        elif i != 2:
+                            # algorithm3 is the incorrect one
+                            self.assertTrue(problem.isPeak(expected[i]),
+                                            message)
+
+    def testAlgorithmTraces(self):
+        matrix = randomMatrix(self.rng, 23, 17, 100)
+        for (i, (recursive, loop)) in enumerate(algorithmPairs):
+            for (name, problem) in self.openBackends(matrix):
+                (expected, actual) = (trace.TraceRecord(), trace.TraceRecord())
+                recursive(problem, trace = expected)
+                loop(problem, trace = actual)
+                self.assertEqual(expected.sequence, actual.sequence,
+                                 "%s, algorithm%d" % (name, i + 1))
+
+    def testTraceWriter(self):
+        matrix = randomMatrix(self.rng, 12, 9, 100)
+        problem = peak.createProblem(matrix)
+        output = StringIO()
+        writer = trace.TraceWriter(output, problem)
+        expected = []
+        for (recursive, loop) in algorithmPairs:
+            record = trace.CompactTraceRecord()
+            recursive(problem, trace = record)
+            expected.append(record.sequence)
+            loop(problem, trace = writer.newRecord())
+        writer.close()
+
+        text = output.getvalue()
+        self.assertTrue(text.startswith("parse(") and text.endswith(")"))
+        data = json.loads(text[len("parse("):-1])
+        self.assertEqual(matrix, data["input"])
+        self.assertEqual(json.loads(json.dumps(expected)), data["steps"])
+
+    def testBatch(self):
+        matrices = [randomMatrix(self.rng, rows, cols, 100)
+                    for (rows, cols) in [(5, 8), (20, 20), (31, 3)]]
+        for (i, matrix) in enumerate(matrices):
+            filename = os.path.join(self.directory,
+                                    "matrix%d%s" % (i, matrixfile.EXTENSION))
+            matrixfile.writeMatrix(filename, matrix)
+        with open(os.path.join(self.directory, "problem.py"), "w") as handle:
+            handle.write("problemMatrix = %r\n" % matrices[0])
+
+        jobs = batch.readJobs(self.directory, "algorithm3")
+        self.assertEqual(len(matrices) + 1, len(jobs))
+        for (filename, name) in jobs:
+            (_, _, location, status, _) = batch.solveJob((filename, name))
+            if filename.endswith(".py"):
+                matrix = matrices[0]
+            else:
+                matrix = matrices[int(os.path.basename(filename)[6])]
+            self.assertEqual("peak", status)
+            self.assertEqual(algorithms.algorithm3(peak.createProblem(matrix)),
+                             location)
+
+    def testAllPeaks(self):
+        for (rows, cols) in matrixSizes:
+            matrix = randomMatrix(self.rng, rows, cols, 5)
+            expected = bruteForcePeaks(matrix)
+            heights = sorted((matrix[r][c] for (r, c) in expected),
+                             reverse = True)
+            for (name, problem) in self.openBackends(matrix):
+                message = "%s, %dx%d" % (name, rows, cols)
+                self.assertEqual(expected, problem.allPeaks(), message)
+                for k in [0, 1, 4, len(expected) + 1]:
+                    top = problem.topKPeaks(k)
+                    self.assertEqual(heights[:k],
+                                     [matrix[r][c] for (r, c) in top],
+                                     message)
+                    self.assertTrue(all(problem.isPeak(location)
+                                        for location in top), message)
+
+    def testIndexedProblem(self):
+        matrix = randomMatrix(self.rng, 19, 26, 50)
+        problem = rangemax.createIndexedProblem(peak.createProblem(matrix))
+        for update in range(200):
+            (r, c) = (self.rng.randrange(19), self.rng.randrange(26))
+            matrix[r][c] = self.rng.randrange(50)
+            problem.set((r, c), matrix[r][c])
+
+            bounds = (self.rng.randrange(19), self.rng.randrange(26))
+            bounds += (self.rng.randint(1, 19 - bounds[0]),
+                       self.rng.randint(1, 26 - bounds[1]))
+            plain = peak.createProblem(matrix).getSubproblem(bounds)
+            subproblem = problem.getSubproblem(bounds)
+            row = self.rng.randrange(bounds[2])
+            col = self.rng.randrange(bounds[3])
+            self.assertEqual(plain.get(plain.getRowMaximum(row)),
+                             subproblem.get(subproblem.getRowMaximum(row)))
+            self.assertEqual(plain.get(plain.getColumnMaximum(col)),
+                             subproblem.get(subproblem.getColumnMaximum(col)))
+            for (recursive, loop) in algorithmPairs:
+                self.assertEqual(recursive(plain), loop(subproblem))
+
+    def testTracker(self):
+        for countCells in [False, True]:
+            matrix = randomMatrix(self.rng, 17, 23, 30)
+            peakTracker = tracker.PeakTracker(peak.createArrayProblem(matrix),
+                                              countCells = countCells)
+            for update in range(300):
+                location = peakTracker.getPeak()
+                self.assertTrue(peakTracker.problem.isPeak(location))
+                # change the peak or a neighbor half of the time
+                if self.rng.random() < 0.5:
+                    (r, c) = location
+                    (dr, dc) = self.rng.choice([(0, 0), (-1, 0), (1, 0),
+                                                (0, -1), (0, 1)])
+                    (r, c) = (min(max(r + dr, 0), 16), min(max(c + dc, 0), 22))
+                else:
+                    (r, c) = (self.rng.randrange(17), self.rng.randrange(23))
+                peakTracker.set((r, c), self.rng.randrange(30))
+                self.assertTrue(peakTracker.problem.isPeak(
+                    peakTracker.getPeak()))
+            stats = peakTracker.getStats()
+            self.assertEqual(300, stats["updates"])
+            self.assertEqual(countCells, stats["cells"] > 0)
+
+    def testNDPeak(self):
+        for shape in [(1,), (12,), (9, 14), (14, 9), (5, 6, 7), (3, 4, 2, 5)]:
+            size = 1
+            for length in shape:
+                size *= length
+            for maximum in [3, 1000]:
+                values = [self.rng.randrange(maximum) for i in range(size)]
+                problem = ndpeak.createNDProblem(values, shape)
+                location = ndpeak.algorithm(problem)
+                self.assertTrue(problem.isPeak(location), str(shape))
+                if len(shape) == 2:
+                    # in two dimensions, it finds a peak like algorithm4
+                    matrix = [values[r * shape[1]:(r + 1) * shape[1]]
+                              for r in range(shape[0])]
+                    flat = peak.createProblem(matrix)
+                    self.assertTrue(flat.isPeak(location))
+
+    def testTiledAllPeaks(self):
+        filename = os.path.join(self.directory, "matrix" + tiled.EXTENSION)
+        for (rows, cols) in [(1, 1), (5, 7), (40, 30), (130, 9)]:
+            matrix = randomMatrix(self.rng, rows, cols, 10)
+            tiled.writeTiled(filename, peak.createProblem(matrix), 8, 8)
+            with tiled.openTiled(filename, 4) as problem:
+                expected = bruteForcePeaks(matrix)
+                self.assertEqual(expected, problem.allPeaks())
+                heights = sorted((matrix[r][c] for (r, c) in expected),
+                                 reverse = True)
+                top = problem.topKPeaks(5)
+                self.assertEqual(heights[:5],
+                                 [matrix[r][c] for (r, c) in top])
+
+    def testMappedMatrix(self):
+        filename = os.path.join(self.directory, "matrix.bin")
+        matrix = randomMatrix(self.rng, 13, 11, 1000)
+        matrixfile.writeMatrix(filename, matrix)
+        flat = [value for row in matrix for value in row]
+        with open(filename, "rb") as handle:
+            mapping = mmap.mmap(handle.fileno(), 0, access = mmap.ACCESS_READ)
+        buffer = matrixfile.MappedMatrix(mapping, "l", len(flat))
+        try:
+            self.assertEqual(flat[5], buffer[5])
+            self.assertEqual(flat[-1], buffer[-1])
+            for (start, stop, step) in [(0, 143, 1), (3, 8, 1), (4, 140, 11),
+                                        (2, 3, 5), (7, 7, 1), (1, 90, 7)]:
+                self.assertEqual(flat[start:stop:step],
+                                 list(buffer[start:stop:step]))
+            problem = peak.ArrayPeakProblem(buffer, 11, (0, 0, 13, 11))
+            self.assertEqual(bruteForcePeaks(matrix), problem.allPeaks())
+        finally:
+            buffer.close()
+
+    def runGenerate(self, arguments, answers = b""):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "generate.py")
+        process = subprocess.Popen([sys.executable, script] + arguments,
+                                   stdin = subprocess.PIPE,
+                                   stdout = subprocess.PIPE,
+                                   cwd = self.directory)
+        process.communicate(answers)
+        self.assertEqual(0, process.returncode)
+
+    def checkGenerated(self, filename, rows, cols, maximum, seed = None):
+        with matrixfile.openMatrix(filename) as problem:
+            self.assertEqual((rows, cols), (problem.numRow, problem.numCol))
+            values = problem.getRows(0, rows)
+        self.assertTrue(all(0 <= value <= maximum for value in values))
+        if seed is not None:
+            expected = generate.randomBlock(seed, 0, rows * cols, maximum)
+            self.assertEqual(list(expected), values)
+
+    def testGenerateArguments(self):
+        self.runGenerate(["matrix.bin", "30", "20", "1000", "7"])
+        filename = os.path.join(self.directory, "matrix.bin")
+        self.checkGenerated(filename, 30, 20, 1000, 7)
+
+    def testGeneratePrompt(self):
+        self.runGenerate([], b"matrix.bin\n")
+        filename = os.path.join(self.directory, "matrix.bin")
+        self.checkGenerated(filename, 10, 10, 200)
+        self.runGenerate([], b"matrix.bin\no\n")
+        self.checkGenerated(filename, 10, 10, 200)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,262 @@
+import array
+import peak
+
+################################################################################
+########################## Range Maximum Index #################################
+################################################################################
+
+# An index over a whole matrix that answers "where is the greatest value in
+# this column, between these two rows?" (and the same for rows) in O(1), for
+# any range.  It is a sparse table: level k holds, for every cell, the flat
+# index of the greatest value among the 2^k cells that start there and go
+# down its column (or along its row).  A range is covered by two overlapping
+# blocks of the largest size that fits in it.
+#
+# Ties are broken in favor of the block that comes first, which gives the
+# first greatest value in the range, just like getColumnMaximum() and
+# getRowMaximum().  The algorithms therefore find the same peaks, and record
+# the same traces, with or without the index.
+#
+# The index takes O(rows * cols * (log(rows) + log(cols))) memory and time to
+# build.  The values and every level are flat array.arrays, not lists.  When a
+# single cell changes, only the O(rows + cols) entries whose blocks contain it
+# are computed again.
+
+class RangeMaxIndex(object):
+    """
+    A sparse table of range maxima over the rows and the columns of the
+    whole matrix of a PeakProblem (of any kind).
+    """
+
+    def __init__(self, problem):
+        """
+        Builds the index from the whole matrix of the given problem, which is
+        read one row at a time with iterRows().
+
+        RUNTIME: O(rows * cols * (log(rows) + log(cols)))
+        """
+
+        typecode = getattr(problem.array, "typecode", None)
+        if typecode is None:
+            typecode = getattr(problem.array, "format", None)
+
+        # matrices of lists are copied as integers, unless they hold others
+        self.values = array.array(typecode or "l")
+        self.rows = 0
+        self.cols = None
+        for row in problem.iterRows():
+            if self.cols is None:
+                self.cols = len(row)
+            elif len(row) != self.cols:
+                raise ValueError("Every row must have the same length")
+            try:
+                row = array.array(self.values.typecode, row)
+            except TypeError:
+                self.values = array.array("d", self.values)
+                row = array.array("d", row)
+            self.values.extend(row)
+            self.rows += 1
+        self.cols = self.cols or 0
+
+        size = self.rows * self.cols
+        self.columnLevels = self.buildLevels(size, self.rows, self.cols)
+        self.rowLevels = self.buildLevels(size, self.cols, 1)
+
+    def buildLevels(self, size, length, stride):
+        """
+        Builds the levels of the sparse table for ranges of up to length
+        cells, stride apart in the flat matrix.  Entries of ranges that run
+        past the end of a row or column are left over, and never used.
+
+        RUNTIME: O(size * log(length))
+        """
+
+        values = self.values
+        levels = [array.array("l", range(size))]
+
+        half = 1
+        while 2 * half <= length:
+            previous = levels[-1]
+            shift = half * stride
+            count = len(previous) - shift
+            levels.append(array.array("l", (
+                a if values[a] >= values[b] else b
+                for (a, b) in zip(previous[:count], previous[shift:]))))
+            half *= 2
+
+        return levels
+
+    def updateLevels(self, levels, index, position, stride):
+        """
+        Computes again the entries of the given levels whose blocks contain
+        the cell at the given flat index, which is the position-th cell of
+        its column (or row).
+
+        RUNTIME: O(2^len(levels))
+        """
+
+        values = self.values
+        half = 1
+        for k in range(1, len(levels)):
+            (previous, level) = (levels[k - 1], levels[k])
+            shift = half * stride
+            # the blocks of level k that start up to 2^k - 1 cells before
+            for j in range(min(2 * half, position + 1)):
+                start = index - j * stride
+                if start < len(level):
+                    (a, b) = (previous[start], previous[start + shift])
+                    level[start] = a if values[a] >= values[b] else b
+            half *= 2
+
+    def set(self, row, col, value):
+        """
+        Changes the value of a cell (in the coordinates of the whole matrix),
+        and the entries of the index that depend on it.
+
+        RUNTIME: O(rows + cols)
+        """
+
+        index = row * self.cols + col
+        self.values[index] = value
+        self.updateLevels(self.columnLevels, index, row, self.cols)
+        self.updateLevels(self.rowLevels, index, col, 1)
+
+    def query(self, levels, first, last, stride):
+        """
+        Returns the flat index of the first greatest value among the cells
+        first, first + stride, ..., last, given as flat indices.
+
+        RUNTIME: O(1)
+        """
+
+        k = ((last - first) // stride + 1).bit_length() - 1
+        level = levels[k]
+        a = level[first]
+        b = level[last - ((1 << k) - 1) * stride]
+        return a if self.values[a] >= self.values[b] else b
+
+    def getColumnMaximum(self, col, startRow, numRow):
+        """
+        Returns the row of the first greatest value in the given column,
+        among the numRow rows starting at startRow (all in the coordinates of
+        the whole matrix).
+
+        RUNTIME: O(1)
+        """
+
+        first = startRow * self.cols + col
+        last = first + (numRow - 1) * self.cols
+        best = self.query(self.columnLevels, first, last, self.cols)
+        return best // self.cols
+
+    def getRowMaximum(self, row, startCol, numCol):
+        """
+        Returns the column of the first greatest value in the given row,
+        among the numCol columns starting at startCol (all in the coordinates
+        of the whole matrix).
+
+        RUNTIME: O(1)
+        """
+
+        first = row * self.cols + startCol
+        last = first + numCol - 1
+        return self.query(self.rowLevels, first, last, 1) - row * self.cols
+
+class IndexedPeakProblem(peak.PeakProblem):
+    """
+    A wrapper around a PeakProblem of any kind, which finds the maxima of its
+    rows and columns with a RangeMaxIndex, rather than by scanning them.  All
+    the subproblems of an IndexedPeakProblem share its index, so that any
+    number of queries on sub-rectangles of the same matrix only pay for one
+    index.
+    """
+
+    def __init__(self, problem, index):
+        """
+        Wraps the given problem, which must not be bigger than the matrix the
+        index was built from.
+
+        RUNTIME: O(1)
+        """
+
+        peak.PeakProblem.__init__(self, problem.array, problem.bounds)
+        self.problem = problem
+        self.index = index
+
+    def get(self, location):
+        return self.problem.get(location)
+
+    def set(self, location, value):
+        """
+        Changes the value at the given location, in the problem and in the
+        index.
+
+        RUNTIME: O(numRow + numCol) of the whole matrix
+        """
+
+        self.problem.set(location, value)
+        (r, c) = location
+        self.index.set(self.startRow + r, self.startCol + c, value)
+
+    def getBetterNeighbor(self, location, trace = None):
+        return self.problem.getBetterNeighbor(location, trace)
+
+    def getRow(self, row):
+        return self.problem.getRow(row)
+
+    def getRowMaximum(self, row, trace = None):
+        """
+        Finds the location of the greatest value in the given row of the
+        current problem, with the index.
+
+        RUNTIME: O(1)
+        """
+
+        col = self.index.getRowMaximum(self.startRow + row, self.startCol,
+                                       self.numCol)
+        bestLoc = (row, col - self.startCol)
+
+        if not trace is None: trace.getRowMaximum(row, self.numCol, bestLoc)
+
+        return bestLoc
+
+    def getColumnMaximum(self, col, trace = None):
+        """
+        Finds the location of the greatest value in the given column of the
+        current problem, with the index.
+
+        RUNTIME: O(1)
+        """
+
+        row = self.index.getColumnMaximum(self.startCol + col, self.startRow,
+                                          self.numRow)
+        bestLoc = (row - self.startRow, col)
+
+        if not trace is None:
+            trace.getColumnMaximum(col, self.numRow, bestLoc)
+
+        return bestLoc
+
+    def toList(self):
+        return self.problem.toList()
+
+    def iterRows(self):
+        return self.problem.iterRows()
+
+    def setBounds(self, bounds):
+        peak.PeakProblem.setBounds(self, bounds)
+        self.problem.setBounds(bounds)
+
+    def getSubproblem(self, bounds):
+        return IndexedPeakProblem(self.problem.getSubproblem(bounds),
+                                  self.index)
+
+def createIndexedProblem(problem):
+    """
+    Builds a RangeMaxIndex over the whole matrix of the given problem, and
+    returns the problem wrapped in an IndexedPeakProblem.
+
+    RUNTIME: O(rows * cols * (log(rows) + log(cols)))
+    """
+
+    return IndexedPeakProblem(problem, RangeMaxIndex(problem))
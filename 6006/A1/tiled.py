@@ -0,0 +1,306 @@
+import array
+import collections
+import struct
+import sys
+import matrixfile
+import peak
+
+################################################################################
+############################## Tiled Matrix Files ##############################
+################################################################################
+
+# A tiled matrix file stores a matrix that may be much larger than memory as
+# tiles of tileRows x tileCols cells.  The tiles are stored one tile column
+# after the other, and each tile column from top to bottom, so that all the
+# tiles that a column of the matrix passes through can be read with one
+# sequential read.  Each tile is stored row by row; tiles on the bottom and
+# right edges of the matrix are padded to the full tile size with zeros.
+#
+# The header is laid out like the header of a binary matrix file (see
+# matrixfile.py), with a different magic number and the tile size added.
+
+MAGIC = b"PKTL"
+VERSION = 1
+HEADER = struct.Struct("<4sBccB8xQQQQ")
+EXTENSION = ".tiles"
+
+# How many tiles are read at once when scanning down a column.
+READ_TILES = 64
+
+def isTiledFile(filename):
+    """
+    Returns true if the given file starts with the tiled matrix file magic
+    number.
+    """
+
+    with open(filename, "rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+def writeTiled(filename, problem, tileRows = 256, tileCols = 256,
+               typecode = "l"):
+    """
+    Writes the matrix of the given PeakProblem (of any kind) to a tiled matrix
+    file.  The matrix is read one tile at a time, through getRow() on a
+    subproblem covering the tile.
+    """
+
+    (rows, cols) = (problem.numRow, problem.numCol)
+    itemsize = array.array(typecode).itemsize
+    byteorder = b"<" if sys.byteorder == "little" else b">"
+
+    with open(filename, "wb") as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, typecode.encode("ascii"),
+                                 byteorder, itemsize, rows, cols, tileRows,
+                                 tileCols))
+
+        for startCol in range(0, cols, tileCols):
+            numCol = min(tileCols, cols - startCol)
+            for startRow in range(0, rows, tileRows):
+                numRow = min(tileRows, rows - startRow)
+                tile = problem.getSubproblem((startRow, startCol, numRow,
+                                              numCol))
+                data = array.array(typecode)
+                for r in range(numRow):
+                    values = tile.getRow(r)
+                    if getattr(values, "typecode", typecode) != typecode:
+                        values = values.tolist()
+                    data.extend(values)
+                    data.extend([0] * (tileCols - numCol))
+                data.extend([0] * ((tileRows - numRow) * tileCols))
+                data.tofile(handle)
+
+class TiledMatrix(object):
+    """
+    A tiled matrix file, opened for reading.  It behaves like the flat,
+    row-major buffer of an ArrayPeakProblem: it can be indexed, and sliced
+    along consecutive cells (possibly running over several rows) or down a
+    column (a slice whose step is the number of columns).  Tiles are read
+    from disk on demand, and the most recently used ones are kept in memory.
+    """
+
+    def __init__(self, filename, cacheTiles = 64):
+        """
+        Opens a tiled matrix file, keeping at most cacheTiles tiles in memory.
+        """
+
+        self.handle = open(filename, "rb")
+        try:
+            self.readHeader()
+        except:
+            self.handle.close()
+            raise
+
+        self.cache = collections.OrderedDict()
+        self.cacheTiles = cacheTiles
+
+        # the amount of I/O done so far
+        self.reads = 0
+        self.bytesRead = 0
+
+    def readHeader(self):
+        """
+        Reads and checks the header of the file.
+        """
+
+        data = self.handle.read(HEADER.size)
+        if len(data) != HEADER.size:
+            raise ValueError("Truncated tiled matrix file header")
+        (magic, version, typecode, byteorder, itemsize, self.rows, self.cols,
+         self.tileRows, self.tileCols) = HEADER.unpack(data)
+        if magic != MAGIC:
+            raise ValueError("Not a tiled matrix file")
+        if version != VERSION:
+            raise ValueError("Unsupported tiled matrix file version %d" %
+                             version)
+
+        self.typecode = typecode.decode("ascii")
+        if array.array(self.typecode).itemsize != itemsize:
+            raise ValueError("Tiled matrix file item size does not match this "
+                             "platform")
+        self.itemsize = itemsize
+        self.swap = (byteorder == b"<") != (sys.byteorder == "little")
+
+        self.tileSize = self.tileRows * self.tileCols
+        self.numTileRows = -(-self.rows // self.tileRows)
+        self.numTileCols = -(-self.cols // self.tileCols)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+
+        self.handle.close()
+        self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def readTiles(self, tileRow, tileCol, count):
+        """
+        Reads count consecutive tiles down a tile column, starting at the
+        given tile, with one read.  Returns them as one array.array.
+        """
+
+        index = tileCol * self.numTileRows + tileRow
+        self.handle.seek(HEADER.size + index * self.tileSize * self.itemsize)
+        data = array.array(self.typecode)
+        data.fromfile(self.handle, count * self.tileSize)
+        if self.swap:
+            data.byteswap()
+
+        self.reads += 1
+        self.bytesRead += count * self.tileSize * self.itemsize
+        return data
+
+    def getTile(self, tileRow, tileCol):
+        """
+        Returns the given tile, from the cache if possible.
+        """
+
+        key = (tileRow, tileCol)
+        tile = self.cache.pop(key, None)
+        if tile is None:
+            tile = self.readTiles(tileRow, tileCol, 1)
+            if len(self.cache) >= self.cacheTiles:
+                self.cache.popitem(last = False)
+        self.cache[key] = tile
+        return tile
+
+    def get(self, row, col):
+        """
+        Returns the value at the given row and column.
+        """
+
+        (tileRow, r) = divmod(row, self.tileRows)
+        (tileCol, c) = divmod(col, self.tileCols)
+        return self.getTile(tileRow, tileCol)[r * self.tileCols + c]
+
+    def getRow(self, row, startCol, numCol):
+        """
+        Returns numCol values of the given row, starting at startCol, as an
+        array.array.  This reads one tile per tile column.
+        """
+
+        (tileRow, r) = divmod(row, self.tileRows)
+        values = array.array(self.typecode)
+        col = startCol
+        while col < startCol + numCol:
+            (tileCol, c) = divmod(col, self.tileCols)
+            count = min(self.tileCols - c, startCol + numCol - col)
+            start = r * self.tileCols + c
+            values.extend(self.getTile(tileRow, tileCol)[start:start + count])
+            col += count
+        return values
+
+    def getColumn(self, col, startRow, numRow):
+        """
+        Returns numRow values of the given column, starting at startRow, as an
+        array.array.  The tiles that are not in the cache are read in runs of
+        up to READ_TILES tiles, each with one sequential read, and are not
+        added to the cache.
+        """
+
+        (tileCol, c) = divmod(col, self.tileCols)
+        values = array.array(self.typecode)
+        if numRow <= 0:
+            return values
+
+        first = startRow // self.tileRows
+        last = (startRow + numRow - 1) // self.tileRows
+        tileRow = first
+
+        while tileRow <= last:
+            tile = self.cache.get((tileRow, tileCol))
+            if tile is not None:
+                (tiles, count) = (tile, 1)
+            else:
+                count = 1
+                while (tileRow + count <= last and count < READ_TILES and
+                       (tileRow + count, tileCol) not in self.cache):
+                    count += 1
+                tiles = self.readTiles(tileRow, tileCol, count)
+
+            for i in range(count):
+                top = (tileRow + i) * self.tileRows
+                r0 = max(startRow, top) - top
+                r1 = min(startRow + numRow, top + self.tileRows) - top
+                start = i * self.tileSize + r0 * self.tileCols + c
+                stop = i * self.tileSize + (r1 - 1) * self.tileCols + c + 1
+                values.extend(tiles[start:stop:self.tileCols])
+
+            tileRow += count
+
+        return values
+
+    def __getitem__(self, index):
+        """
+        Indexes the matrix as if it were a flat, row-major buffer.  Slices
+        must either have a step of 1, in which case they are read one row at
+        a time, or go down a single column (with a step equal to the number
+        of columns); they are returned as array.arrays.
+        """
+
+        if not isinstance(index, slice):
+            (row, col) = divmod(index, self.cols)
+            return self.get(row, col)
+
+        (start, stop, step) = index.indices(len(self))
+        count = len(range(start, stop, step))
+        (row, col) = divmod(start, self.cols)
+        if count == 0:
+            return array.array(self.typecode)
+        if step == 1:
+            values = self.getRow(row, col, min(count, self.cols - col))
+            while len(values) < count:
+                row += 1
+                values.extend(self.getRow(row, 0, min(count - len(values),
+                                                      self.cols)))
+            return values
+        if step == self.cols:
+            return self.getColumn(col, row, count)
+        raise ValueError("Slices must have a step of 1 or go down a column")
+
+def openTiled(filename, cacheTiles = 64):
+    """
+    Opens a tiled matrix file as an ArrayPeakProblem, which reads the matrix
+    from disk tile by tile as the algorithms need it.  The file stays open
+    until the problem is closed, with close() or a with statement.
+    """
+
+    matrix = TiledMatrix(filename, cacheTiles)
+    return peak.ArrayPeakProblem(matrix, matrix.cols,
+                                 (0, 0, matrix.rows, matrix.cols))
+
+def main():
+    """
+    Command line entry point, converting a binary matrix file (see
+    matrixfile.py) into a tiled matrix file:
+
+        python tiled.py <matrix file> <tiled file> [<tile rows> <tile cols>]
+    """
+
+    if len(sys.argv) < 3:
+        print("usage: python tiled.py <matrix file> <tiled file> "
+              "[<tile rows> <tile cols>]")
+        return
+
+    (tileRows, tileCols) = (256, 256)
+    if len(sys.argv) > 4:
+        (tileRows, tileCols) = (int(sys.argv[3]), int(sys.argv[4]))
+
+    problem = matrixfile.openMatrix(sys.argv[1])
+    typecode = getattr(problem.array, "typecode", None)
+    if typecode is None:
+        typecode = problem.array.format
+
+    writeTiled(sys.argv[2], problem, tileRows, tileCols, typecode)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 import peak
 
 ################################################################################
@@ -19,6 +20,15 @@ class TraceRecord(object):
 
         self.sequence = []
 
+    def record(self, event):
+        """
+        Adds an event to the trace.
+
+        RUNTIME: O(1)
+        """
+
+        self.sequence.append(event)
+
     def getMaximum(self, arguments, maximum):
         """
         A function for recording the fact that the getMaximum function of
@@ -27,16 +37,52 @@ class TraceRecord(object):
         RUNTIME: O(1)
         """
 
-        self.sequence.append({
+        self.record({
             "type" : "findingMaximum",
             "coords" : arguments
         })
         
-        self.sequence.append({
+        self.record({
             "type" : "foundMaximum",
             "coord" : maximum
         })
 
+    def getRowMaximum(self, row, numCol, maximum):
+        """
+        A function for recording the fact that the getRowMaximum function of
+        some subproblem has been called.  The scanned row is recorded as a list
+        of coordinates, exactly as if getMaximum had been called on it.
+
+        RUNTIME: O(numCol)
+        """
+
+        self.getMaximum([(row, c) for c in range(numCol)], maximum)
+
+    def getColumnMaximum(self, col, numRow, maximum):
+        """
+        A function for recording the fact that the getColumnMaximum function
+        of some subproblem has been called.  The scanned column is recorded as
+        a list of coordinates, exactly as if getMaximum had been called on it.
+
+        RUNTIME: O(numRow)
+        """
+
+        self.getMaximum([(r, col) for r in range(numRow)], maximum)
+
+    def getCrossMaximum(self, row, col, numRow, numCol, maximum):
+        """
+        A function for recording the fact that the getCrossMaximum function of
+        some subproblem has been called.  The scanned row and column are
+        recorded as a list of coordinates, exactly as if getMaximum had been
+        called on them.
+
+        RUNTIME: O(numRow + numCol)
+        """
+
+        cross = [(row, c) for c in range(numCol)]
+        cross.extend([(r, col) for r in range(numRow)])
+        self.getMaximum(cross, maximum)
+
     def getBetterNeighbor(self, neighbor, better):
         """
         A function for recording the fact that the getBetterNeighbor function
@@ -45,13 +91,13 @@ class TraceRecord(object):
         RUNTIME: O(1)
         """
 
-        self.sequence.append({
+        self.record({
             "type" : "findingNeighbor",
             "coord" : neighbor
         })
 
         if (neighbor != better):
-            self.sequence.append({
+            self.record({
                 "type" : "foundNeighbor",
                 "coord" : better
             })
@@ -64,7 +110,7 @@ class TraceRecord(object):
         RUNTIME: O(1)
         """
 
-        self.sequence.append({
+        self.record({
             "type" : "subproblem",
             "startRow" : subproblem.startRow,
             "numRows" : subproblem.numRow,
@@ -80,7 +126,7 @@ class TraceRecord(object):
         RUNTIME: O(1)
         """
 
-        self.sequence.append({
+        self.record({
             "type" : "bestSeen",
             "coord" : bestSeen
         })
@@ -92,7 +138,216 @@ class TraceRecord(object):
         RUNTIME: O(1)
         """
 
-        self.sequence.append({
+        self.record({
             "type" : "foundPeak",
             "coord" : peak
         })
+
+################################################################################
+################### Classes for Compact and Streamed Traces ####################
+################################################################################
+
+# Detail levels for CompactTraceRecord.  DETAIL_ALL records every event, like
+# TraceRecord.  DETAIL_DIVIDERS drops the getBetterNeighbor events, of which
+# there are many in algorithm2.  DETAIL_PEAKS only records the subproblems and
+# the peak that was found.
+DETAIL_PEAKS = 0
+DETAIL_DIVIDERS = 1
+DETAIL_ALL = 2
+
+class CompactTraceRecord(TraceRecord):
+    """
+    A trace that records the rows and columns scanned by getRowMaximum,
+    getColumnMaximum and getCrossMaximum as ranges instead of as lists of
+    coordinates, and that can leave out events below a given detail level.
+    Each event then takes O(1) space, so the trace takes O(events) space
+    instead of O(cells scanned).
+
+    A range is a list [row, col, rowStep, colStep, count], standing for the
+    count locations (row + i * rowStep, col + i * colStep).  The visualizer
+    expands ranges back into coordinates.
+    """
+
+    def __init__(self, detail = DETAIL_ALL):
+        """
+        Initialize the trace to empty, recording events up to the given detail
+        level.
+
+        RUNTIME: O(1)
+        """
+
+        TraceRecord.__init__(self)
+        self.detail = detail
+
+    def getMaximum(self, arguments, maximum):
+        """
+        A function for recording the fact that the getMaximum function of
+        some subproblem has been called.
+
+        RUNTIME: O(len(arguments))
+        """
+
+        if self.detail >= DETAIL_DIVIDERS:
+            TraceRecord.getMaximum(self, arguments, maximum)
+
+    def getMaximumOfRanges(self, ranges, maximum):
+        """
+        A function for recording the fact that the maximum of the given ranges
+        of locations has been found.
+
+        RUNTIME: O(len(ranges))
+        """
+
+        if self.detail < DETAIL_DIVIDERS:
+            return
+
+        self.record({
+            "type" : "findingMaximum",
+            "ranges" : ranges
+        })
+
+        self.record({
+            "type" : "foundMaximum",
+            "coord" : maximum
+        })
+
+    def getRowMaximum(self, row, numCol, maximum):
+        """
+        A function for recording the fact that the getRowMaximum function of
+        some subproblem has been called.
+
+        RUNTIME: O(1)
+        """
+
+        self.getMaximumOfRanges([[row, 0, 0, 1, numCol]], maximum)
+
+    def getColumnMaximum(self, col, numRow, maximum):
+        """
+        A function for recording the fact that the getColumnMaximum function
+        of some subproblem has been called.
+
+        RUNTIME: O(1)
+        """
+
+        self.getMaximumOfRanges([[0, col, 1, 0, numRow]], maximum)
+
+    def getCrossMaximum(self, row, col, numRow, numCol, maximum):
+        """
+        A function for recording the fact that the getCrossMaximum function of
+        some subproblem has been called.
+
+        RUNTIME: O(1)
+        """
+
+        self.getMaximumOfRanges([[row, 0, 0, 1, numCol],
+                                 [0, col, 1, 0, numRow]], maximum)
+
+    def getBetterNeighbor(self, neighbor, better):
+        """
+        A function for recording the fact that the getBetterNeighbor function
+        of some subproblem has been called.
+
+        RUNTIME: O(1)
+        """
+
+        if self.detail >= DETAIL_ALL:
+            TraceRecord.getBetterNeighbor(self, neighbor, better)
+
+    def setBestSeen(self, bestSeen):
+        """
+        A function for recording the fact that the variable "bestSeen" has been
+        updated.
+
+        RUNTIME: O(1)
+        """
+
+        if self.detail >= DETAIL_DIVIDERS:
+            TraceRecord.setBestSeen(self, bestSeen)
+
+class StreamingTraceRecord(CompactTraceRecord):
+    """
+    A compact trace that writes each event to a TraceWriter as soon as it
+    happens, instead of keeping it in self.sequence.  It takes O(1) space.
+    """
+
+    def __init__(self, writer, detail = DETAIL_ALL):
+        """
+        Initialize the trace, sending its events to the given TraceWriter.
+
+        RUNTIME: O(1)
+        """
+
+        CompactTraceRecord.__init__(self, detail)
+        self.writer = writer
+
+    def record(self, event):
+        """
+        Writes an event to the trace file.
+
+        RUNTIME: O(1)
+        """
+
+        self.writer.writeEvent(event)
+
+class TraceWriter(object):
+    """
+    Writes a trace file for the HTML visualizer incrementally: first the
+    matrix, one row at a time, then the events of one or more traces as they
+    are recorded.  The file has the same layout as the one that main.py used
+    to write with a single call to json.dump.
+    """
+
+    def __init__(self, file, problem):
+        """
+        Starts a trace file for the given problem, writing out its whole
+        matrix.
+
+        RUNTIME: O(rows * cols)
+        """
+
+        self.file = file
+        self.records = 0
+        self.events = 0
+
+        self.file.write('parse({"input" : [')
+        for (i, row) in enumerate(problem.iterRows()):
+            if i > 0: self.file.write(", ")
+            json.dump(row, self.file)
+        self.file.write('], "steps" : [')
+
+    def newRecord(self, detail = DETAIL_ALL):
+        """
+        Starts the trace of a new algorithm, and returns a StreamingTraceRecord
+        that writes its events to this file.
+
+        RUNTIME: O(1)
+        """
+
+        if self.records > 0:
+            self.file.write("]")
+        self.file.write(", [" if self.records > 0 else "[")
+        self.records += 1
+        self.events = 0
+        return StreamingTraceRecord(self, detail)
+
+    def writeEvent(self, event):
+        """
+        Writes an event of the current trace to the file.
+
+        RUNTIME: O(1)
+        """
+
+        if self.events > 0: self.file.write(", ")
+        json.dump(event, self.file)
+        self.events += 1
+
+    def close(self):
+        """
+        Finishes the trace file.  The file itself is not closed.
+
+        RUNTIME: O(1)
+        """
+
+        if self.records > 0:
+            self.file.write("]")
+        self.file.write("]})")
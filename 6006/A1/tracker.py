@@ -0,0 +1,150 @@
+import instrument
+import iterative
+
+################################################################################
+############################ Maintaining a Peak ################################
+################################################################################
+
+class PeakTracker(object):
+    """
+    A mutable peak-finding problem that keeps track of a peak while the
+    values in its matrix are changed one at a time.
+
+    Whether a location is a peak only depends on its own value and those of
+    its neighbors, so a change anywhere else cannot make the last known peak
+    stop being one.  Changes near the peak only mark it as stale; it is
+    checked again the next time it is asked for.  If it is no longer a peak,
+    the tracker climbs to a better neighbor, starting from the cell that
+    changed, until it reaches a peak.  If the climb takes more than climbLimit
+    steps, it gives up and finds a peak from scratch with a divide and conquer
+    algorithm instead, so no update costs more than O(numRow + numCol) reads.
+    """
+
+    def __init__(self, problem, algorithm = iterative.algorithm4,
+                 climbLimit = None, countCells = False):
+        """
+        Tracks a peak of the given problem, using the given algorithm when it
+        has to find one from scratch.  climbLimit defaults to
+        numRow + numCol.  If countCells is true, the matrix cells read are
+        counted in the stats, which makes searches from scratch run on a
+        profiled copy of the problem (see instrument.py).
+
+        RUNTIME: O(1)
+        """
+
+        self.problem = problem
+        self.algorithm = algorithm
+        self.climbLimit = climbLimit
+        self.countCells = countCells
+        if climbLimit is None:
+            self.climbLimit = problem.numRow + problem.numCol
+
+        self.peak = None
+        self.stale = False
+        self.changed = None
+
+        self.stats = {"updates" : 0, "validations" : 0, "climbs" : 0,
+                      "climbSteps" : 0, "fullSearches" : 0, "cells" : 0}
+
+    def get(self, location):
+        """
+        Returns the value at the given location.
+
+        RUNTIME: O(1)
+        """
+
+        return self.problem.get(location)
+
+    def set(self, location, value):
+        """
+        Changes the value at the given location.  If the location is the last
+        known peak or one of its neighbors, the peak is marked as stale.
+
+        RUNTIME: O(1)
+        """
+
+        self.problem.set(location, value)
+        self.stats["updates"] += 1
+
+        if self.peak is not None:
+            (r, c) = location
+            (peakR, peakC) = self.peak
+            if abs(r - peakR) + abs(c - peakC) <= 1:
+                self.stale = True
+                self.changed = location
+
+    def getPeak(self):
+        """
+        Returns a peak of the problem, checking the last known peak again
+        first if it is stale.
+
+        RUNTIME: O(1) if the last known peak is still a peak, and
+                 O(numRow + numCol) otherwise
+        """
+
+        if self.peak is None:
+            self.findPeak()
+        elif self.stale:
+            self.stats["validations"] += 1
+            if self.countCells:
+                self.stats["cells"] += 5
+            if not self.problem.isPeak(self.peak):
+                self.climb(self.changed)
+
+        self.stale = False
+        self.changed = None
+        return self.peak
+
+    def climb(self, location):
+        """
+        Climbs from the given location to a better neighbor until reaching a
+        peak, or until climbLimit steps have been taken, in which case it
+        finds a peak from scratch instead.
+
+        RUNTIME: O(climbLimit + numRow + numCol)
+        """
+
+        self.stats["climbs"] += 1
+
+        for step in range(self.climbLimit):
+            neighbor = self.problem.getBetterNeighbor(location)
+            self.stats["climbSteps"] += 1
+            if self.countCells:
+                self.stats["cells"] += 5
+            if neighbor == location:
+                self.peak = location
+                return
+            location = neighbor
+
+        self.findPeak()
+
+    def findPeak(self):
+        """
+        Finds a peak from scratch, with the tracker's algorithm.
+
+        RUNTIME: that of the algorithm
+        """
+
+        self.stats["fullSearches"] += 1
+        if not self.countCells:
+            self.peak = self.algorithm(self.problem)
+            return
+
+        (self.peak, profile) = instrument.profileAlgorithm(self.algorithm,
+                                                           self.problem)
+        self.stats["cells"] += profile.getCells()
+
+    def getStats(self):
+        """
+        Returns the work done so far, as a dictionary: the number of updates,
+        of stale peaks checked, of climbs and climbing steps, of searches
+        from scratch, and of matrix cells read, in total and per update (0
+        unless countCells was true).
+
+        RUNTIME: O(1)
+        """
+
+        stats = dict(self.stats)
+        stats["cellsPerUpdate"] = (float(stats["cells"]) /
+                                   max(1, stats["updates"]))
+        return stats
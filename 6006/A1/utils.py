@@ -1,4 +1,9 @@
 import os
+import sys
+
+# Python 3 doesn't have raw_input, and input behaves like raw_input.
+if sys.version_info >= (3,):
+    raw_input = input
 
 def getOpenFilename(default = None):
     """
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import json   # Used when FORMAT=json
+import os     # Used to get the QUEUE, DELAY, VECTORS and FORMAT variables
+import sys
+import timeit
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import circuit
+import generate
+
+
+# Simulator benchmark on synthetic circuits of growing sizes.
+
+# Circuit kind -> (function building a NetlistWriter from a size, sizes).
+# Sorters and random circuits go up to millions of gates. Transitions multiply
+# as they ripple through multipliers and adders, so a few thousand gates of
+# those already take a long time to simulate.
+KINDS = {
+    'multiplier': (generate.multiplier, [8, 16, 32, 64]),
+    'sorter': (generate.bitonic_sorter, [1024, 4096, 16384, 32768]),
+    'adders': (lambda size: generate.adder_tree(size, 16),
+               [16, 64, 256, 1024]),
+    'random': (lambda size: generate.random_dag(size, 16, 2),
+               [10000, 100000, 1000000]),
+}
+
+def benchmark(writer, vectors, queue_class, inertial):
+    """Times the parsing, simulation and output of a synthetic circuit.
+
+    Args:
+        writer: The NetlistWriter holding the circuit.
+        vectors: The number of random input vectors to simulate.
+        queue_class: The event queue implementation, PriorityQueue or
+            CalendarQueue.
+        inertial: True to simulate gates with inertial delays.
+
+    Returns:
+        A dictionary with the number of gates and probe results, and the
+        seconds spent parsing, simulating and writing out the results.
+    """
+    writer.add_random_flips(vectors)
+    text = StringIO("\n".join(writer.lines()) + "\n")
+    # The circuit is only kept by the simulation while it is timed.
+    del writer
+
+    timer = timeit.default_timer
+    start = timer()
+    sim = circuit.Simulation.from_file(text, queue_class, inertial)
+    parsed = timer()
+    sim.run()
+    simulated = timer()
+    sim.outputs_to_file(StringIO())
+    written = timer()
+
+    return {'gates': len(sim.circuit.gates), 'probes': len(sim.probes),
+            'parse': parsed - start, 'simulate': simulated - parsed,
+            'output': written - simulated}
+
+# Command-line controller.
+if __name__ == '__main__':
+    # Arguments are a circuit kind followed by sizes, or just circuit kinds.
+    if len(sys.argv) > 2 and sys.argv[2].isdigit():
+        runs = [(sys.argv[1], [int(size) for size in sys.argv[2:]])]
+    else:
+        runs = [(kind, KINDS[kind][1])
+                for kind in (sys.argv[1:] or sorted(KINDS))]
+    queue_class = circuit.PriorityQueue
+    if os.environ.get('QUEUE') == 'calendar':
+        queue_class = circuit.CalendarQueue
+    inertial = os.environ.get('DELAY') == 'inertial'
+    vectors = int(os.environ.get('VECTORS', '4'))
+
+    results = []
+    if os.environ.get('FORMAT') != 'json':
+        print('%-10s %8s %9s %8s %9s %9s %9s' % (
+            'kind', 'size', 'gates', 'probes', 'parse', 'simulate', 'output'))
+    for kind, sizes in runs:
+        for size in sizes:
+            result = benchmark(KINDS[kind][0](size), vectors, queue_class,
+                               inertial)
+            result.update({'kind': kind, 'size': size})
+            results.append(result)
+            if os.environ.get('FORMAT') != 'json':
+                print('%-10s %8d %9d %8d %8.3fs %8.3fs %8.3fs' % (
+                    kind, size, result['gates'], result['probes'],
+                    result['parse'], result['simulate'], result['output']))
+                sys.stdout.flush()
+    if os.environ.get('FORMAT') == 'json':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
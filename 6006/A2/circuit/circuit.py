@@ -1,9 +1,16 @@
 #!/usr/bin/env python
 
+import array  # Used by Netlist
+import collections  # Used by CalendarQueue
+import hashlib  # Used to key the Netlist cache
+import heapq  # Used by CalendarQueue
 import json   # Used when TRACE=jsonp
+import multiprocessing  # Used by PartitionedSimulation
 import os     # Used to get the TRACE environment variable
 import re     # Used when TRACE=jsonp
+import struct  # Used by Netlist
 import sys    # Used to smooth over the range / xrange issue.
+import timeit  # Used by SimulationStats
 
 # Python 3 doesn't have xrange, and range behaves like xrange.
 if sys.version_info >= (3,):
@@ -29,6 +36,9 @@ class TruthTable:
         self.name = name
         self.table = self._build_table(output_list)
         self.input_count = self._table_depth(self.table)
+        # The same entries, indexed by the inputs packed into an integer with
+        # input 0 as the most significant bit. See Gate.input_bits.
+        self.flat_table = bytearray(output_list)
 
     def output(self, inputs):
         """Computes the output for this truth table, given a list of inputs."""
@@ -39,6 +49,59 @@ class TruthTable:
             value = value[i]
         return value
 
+    def output_from_bits(self, input_bits):
+        """Computes the output for this truth table, given the inputs packed
+        into an integer, with input 0 as the most significant bit."""
+        return self.flat_table[input_bits]
+
+    def bitwise_expression(self, names):
+        """A Python expression computing this truth table with bitwise ops.
+        
+        The expression works on integers holding one bit per independent set of
+        inputs, so it computes the outputs for all of them at once.
+        
+        Args:
+            names: Python expressions for the inputs, in order.
+        
+        Returns:
+            An expression using the names, and m, an integer with all the bits
+            in use set.
+        """
+        if len(names) != self.input_count:
+            raise ValueError('Names list is incorrectly sized')
+        return self._bitwise_expression(list(self.flat_table), names)
+
+    def _bitwise_expression(self, entries, names):
+        # Builds an expression for a flat list of truth table entries, by
+        # splitting on the first input (Shannon expansion), and recognizing
+        # constants, inputs that don't matter, and XORs along the way.
+        if 1 not in entries:
+            return '0'
+        if 0 not in entries:
+            return 'm'
+        half = len(entries) // 2
+        low, high = entries[:half], entries[half:]
+        name, rest = names[0], names[1:]
+        if low == high:
+            return self._bitwise_expression(low, rest)
+        if high == [1 - entry for entry in low]:
+            low_expression = self._bitwise_expression(low, rest)
+            if low_expression == '0':
+                return name
+            return '(%s ^ %s)' % (name, low_expression)
+        terms = []
+        high_expression = self._bitwise_expression(high, rest)
+        if high_expression == 'm':
+            terms.append(name)
+        elif high_expression != '0':
+            terms.append('(%s & %s)' % (name, high_expression))
+        low_expression = self._bitwise_expression(low, rest)
+        if low_expression == 'm':
+            terms.append('(m ^ %s)' % name)
+        elif low_expression != '0':
+            terms.append('(%s & ~%s)' % (low_expression, name))
+        return '(%s)' % ' | '.join(terms)
+
     def _build_table(self, output_list):
         # Builds an evaluation table out of a list of truth table values.
         #
@@ -102,22 +165,253 @@ class GateType:
         """
         return self.delay + input_time
 
-class Gate:
-    """A gate in a circuit."""
+class GateArrays:
+    """The gates of a circuit, stored as a struct of arrays.
+    
+    Gates are numbered in the order they are added, and each of their
+    attributes is kept in a list or array indexed by gate number, instead of
+    in a Python object per gate. Gate instances are views on one entry of the
+    arrays; they are created when asked for, by gate, and are not kept, so
+    they only use memory while something holds on to them.
+    
+    A gate's inputs are at positions in_offsets[i] to in_offsets[i + 1] of
+    in_ids (-1 for an unconnected input). Connections are recorded in the
+    order they are made, as edges, and turned into a compressed sparse row
+    fan-out by fan_out.
+    """
+    
+    def __init__(self):
+        """Creates an empty set of gates."""
+        self.names = []
+        self.ids = {}
+        # GateTypes and flat truth tables, numbered in the order first used.
+        self.types = []
+        self.type_index = {}
+        self.tables = []
+        self.table_index = {}
+        
+        self.type_ids = array.array('l')
+        self.table_ids = array.array('l')
+        self.delays = array.array('l')
+        self.outputs = bytearray()
+        # See Gate.input_bits.
+        self.input_bits = array.array('l')
+        self.probed = bytearray()
+        self.in_offsets = array.array('l', [0])
+        self.in_ids = array.array('l')
+        
+        self.edge_from = array.array('l')
+        self.edge_to = array.array('l')
+        self.edge_masks = array.array('l')
+        self._fan_out = None
+        
+        # Gate number -> the gate's pending Transition, in inertial delay mode.
+        self.pending = {}
+    
+    def __len__(self):
+        # Number of gates.
+        return len(self.names)
+    
+    def add(self, name, gate_type):
+        """Adds an unconnected gate whose initial output is false.
+        
+        Args:
+            name: User-friendly name for the gate.
+            gate_type: GateType instance specifying the gate's behavior.
+        
+        Returns:
+            The new gate's number.
+        """
+        gate_id = len(self.names)
+        self.names.append(name)
+        self.ids[name] = gate_id
+        
+        if gate_type not in self.type_index:
+            self.type_index[gate_type] = len(self.types)
+            self.types.append(gate_type)
+        table = gate_type.truth_table
+        if table not in self.table_index:
+            self.table_index[table] = len(self.tables)
+            self.tables.append(table.flat_table)
+        
+        self.type_ids.append(self.type_index[gate_type])
+        self.table_ids.append(self.table_index[table])
+        self.delays.append(gate_type.delay)
+        self.outputs.append(0)
+        self.input_bits.append(0)
+        self.probed.append(0)
+        self.in_ids.extend([-1] * gate_type.input_count)
+        self.in_offsets.append(len(self.in_ids))
+        return gate_id
+    
+    def connect(self, gate_id, in_gate_id, terminal):
+        """Connects one of a gate's input terminals to another gate's output.
+        
+        Args:
+            gate_id: The number of the gate whose input terminal will be
+                connected.
+            in_gate_id: The number of the gate whose output terminal will be
+                connected.
+            terminal: The number of the input terminal that will be connected
+                (using 0-based indexing)
+        """
+        input_count = self.in_offsets[gate_id + 1] - self.in_offsets[gate_id]
+        if terminal < 0 or terminal >= input_count:
+            raise IndexError('Invalid input terminal')
+        slot = self.in_offsets[gate_id] + terminal
+        if self.in_ids[slot] != -1:
+            raise RuntimeError('Input terminal already connected')
+        self.in_ids[slot] = in_gate_id
+        mask = 1 << (input_count - 1 - terminal)
+        self.edge_from.append(in_gate_id)
+        self.edge_to.append(gate_id)
+        self.edge_masks.append(mask)
+        if self.outputs[in_gate_id]:
+            self.input_bits[gate_id] |= mask
+    
+    def fan_out(self):
+        """The gates driven by each gate, in compressed sparse row form.
+        
+        Returns:
+            A tuple (out_offsets, out_ids, out_masks). The gates driven by gate
+            i are at positions out_offsets[i] to out_offsets[i + 1] of out_ids,
+            in the order they were connected, and the matching entries of
+            out_masks are the bits of their input_bits that gate i drives.
+        """
+        count = len(self.names)
+        edge_count = len(self.edge_from)
+        if self._fan_out is not None and self._fan_out[0] == (count,
+                                                              edge_count):
+            return self._fan_out[1]
+        
+        out_offsets = array.array('l', [0]) * (count + 1)
+        for gate_id in self.edge_from:
+            out_offsets[gate_id + 1] += 1
+        for i in xrange(count):
+            out_offsets[i + 1] += out_offsets[i]
+        out_ids = array.array('l', [0]) * edge_count
+        out_masks = array.array('l', [0]) * edge_count
+        next_slots = out_offsets[:-1]
+        for edge in xrange(edge_count):
+            gate_id = self.edge_from[edge]
+            slot = next_slots[gate_id]
+            out_ids[slot] = self.edge_to[edge]
+            out_masks[slot] = self.edge_masks[edge]
+            next_slots[gate_id] = slot + 1
+        
+        self._fan_out = ((count, edge_count), (out_offsets, out_ids, out_masks))
+        return self._fan_out[1]
+    
+    def gate(self, gate_id):
+        """A new Gate view of a gate, given its number."""
+        view = Gate.__new__(Gate)
+        view.arrays = self
+        view.id = gate_id
+        return view
+
+class Gate(object):
+    """A gate in a circuit.
+    
+    This is a view on one entry of a GateArrays. Each call to GateArrays.gate
+    (or Circuit.gates) returns a new view, and views of the same gate compare
+    and hash equal, so they can be used interchangeably, except with is.
+    """
+    
+    __slots__ = ('arrays', 'id')
 
     def __init__(self, name, gate_type):
         """ Creates an unconnected gate whose initial output is false.
         
+        The gate is stored in its own GateArrays. Gates in a Circuit are
+        created by Circuit.add_gate.
+        
         Args:
             name: User-friendly name for the gate.
             gate_type: GateType instance specifying the gate's behavior.
         """
-        self.name = name
-        self.gate_type = gate_type
-        self.in_gates = [None for i in xrange(gate_type.input_count)]
-        self.out_gates = []
-        self.probed = False
-        self.output = 0
+        self.arrays = GateArrays()
+        self.id = self.arrays.add(name, gate_type)
+    
+    def __eq__(self, other):
+        return (isinstance(other, Gate) and self.id == other.id and
+                self.arrays is other.arrays)
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def __hash__(self):
+        return self.id
+    
+    @property
+    def name(self):
+        return self.arrays.names[self.id]
+    
+    @property
+    def gate_type(self):
+        return self.arrays.types[self.arrays.type_ids[self.id]]
+    
+    @property
+    def in_gates(self):
+        arrays = self.arrays
+        return [None if in_id == -1 else arrays.gate(in_id) for in_id in
+                arrays.in_ids[arrays.in_offsets[self.id]:
+                              arrays.in_offsets[self.id + 1]]]
+    
+    @property
+    def out_gates(self):
+        out_offsets, out_ids, out_masks = self.arrays.fan_out()
+        return [self.arrays.gate(out_id) for out_id in
+                out_ids[out_offsets[self.id]:out_offsets[self.id + 1]]]
+    
+    @property
+    def out_masks(self):
+        # out_masks[i] is the bit of out_gates[i].input_bits that this gate's
+        # output drives.
+        out_offsets, out_ids, out_masks = self.arrays.fan_out()
+        return list(out_masks[out_offsets[self.id]:out_offsets[self.id + 1]])
+    
+    @property
+    def probed(self):
+        return self.arrays.probed[self.id] == 1
+    
+    @probed.setter
+    def probed(self, probed):
+        self.arrays.probed[self.id] = 1 if probed else 0
+    
+    @property
+    def output(self):
+        return self.arrays.outputs[self.id]
+    
+    @output.setter
+    def output(self, output):
+        self.arrays.outputs[self.id] = output
+    
+    @property
+    def input_bits(self):
+        # The outputs of in_gates, packed into an integer with input 0 as the
+        # most significant bit. Kept up to date by Transition.apply.
+        return self.arrays.input_bits[self.id]
+    
+    @input_bits.setter
+    def input_bits(self, input_bits):
+        self.arrays.input_bits[self.id] = input_bits
+    
+    @property
+    def flat_table(self):
+        return self.arrays.tables[self.arrays.table_ids[self.id]]
+    
+    @property
+    def pending(self):
+        # The transition of this gate's output that is waiting in the queue,
+        # only used by Simulations in inertial delay mode.
+        return self.arrays.pending.get(self.id)
+    
+    @pending.setter
+    def pending(self, transition):
+        if transition is None:
+            self.arrays.pending.pop(self.id, None)
+        else:
+            self.arrays.pending[self.id] = transition
   
     def connect_input(self, gate, terminal):
         """Connects one of this gate's input terminals to another gate's output.
@@ -127,10 +421,9 @@ class Gate:
             terminal: The number of this gate's input terminal that will be 
                 connected (using 0-based indexing)
         """
-        if self.in_gates[terminal] is not None:
-            raise RuntimeError('Input terminal already connected')
-        self.in_gates[terminal] = gate
-        gate.out_gates.append(self)
+        if gate.arrays is not self.arrays:
+            raise ValueError('Gates belong to different circuits')
+        self.arrays.connect(self.id, gate.id, terminal)
       
     def probe(self):
         """Marks this gate as probed.
@@ -167,7 +460,7 @@ class Gate:
         a delay from its inputs' transitions to the output's transition. The 
         circuit simulator is responsible for setting the appropriate time. 
         """
-        return self.gate_type.output([gate.output for gate in self.in_gates])
+        return self.flat_table[self.input_bits]
   
     def transition_time(self, input_time):
         """The time that the gate's output will reflect a change in its inputs.
@@ -184,18 +477,58 @@ class Gate:
                 'inputs': [g and g.name for g in self.in_gates],
         'outputs': [g and g.name for g in self.out_gates]}
 
+class GateMap:
+    """Read-only dictionary of the gates in a GateArrays, by name."""
+    
+    def __init__(self, arrays):
+        """Creates a dictionary view of a GateArrays."""
+        self.arrays = arrays
+    
+    def __len__(self):
+        return len(self.arrays.names)
+    
+    def __contains__(self, name):
+        return name in self.arrays.ids
+    
+    def __getitem__(self, name):
+        return self.arrays.gate(self.arrays.ids[name])
+    
+    def __iter__(self):
+        return iter(self.arrays.names)
+    
+    def keys(self):
+        return list(self.arrays.names)
+    
+    def itervalues(self):
+        for gate_id in xrange(len(self.arrays.names)):
+            yield self.arrays.gate(gate_id)
+    
+    def values(self):
+        return list(self.itervalues())
+    
+    def iteritems(self):
+        for gate in self.itervalues():
+            yield gate.name, gate
+    
+    def items(self):
+        return list(self.iteritems())
+
 class Circuit:
     """The topology of a combinational circuit, and a snapshot of its state.
     
     This class contains topological information about a circuit (how the gates 
     are connected to each other) as well as information about the gates' states
     (values at their output terminals) at an instance of time.
+    
+    The gates are stored in a GateArrays, and self.gates is a dictionary view
+    of them, by name.
     """
     def __init__(self):
         """Creates an empty circuit."""
         self.truth_tables = {}
         self.gate_types = {}
-        self.gates = {}
+        self.arrays = GateArrays()
+        self.gates = GateMap(self.arrays)
 
     def add_truth_table(self, name, output_list):
         """Adds a truth table that can be later attached to gate types.
@@ -245,11 +578,10 @@ class Circuit:
         if name in self.gates:
             raise ValueError('Gate name already used')
         gate_type = self.gate_types[type_name]
-        self.gates[name] = new_gate = Gate(name, gate_type)
+        gate_id = self.arrays.add(name, gate_type)
         for i in xrange(len(input_names)):
-            gate = self.gates[input_names[i]]
-            new_gate.connect_input(gate, i)
-        return new_gate
+            self.arrays.connect(gate_id, self.arrays.ids[input_names[i]], i)
+        return self.arrays.gate(gate_id)
     
     def add_probe(self, gate_name):
         """Adds a gate to the list of outputs."""
@@ -264,6 +596,9 @@ class Circuit:
 
 class Transition:
     """A transition in a gate's output."""
+    
+    # Set on transitions that were superseded while waiting in the queue.
+    cancelled = False
   
     def __init__(self, gate, new_output, time):
         """Creates a potential transition of a gate's output to a new value.
@@ -310,7 +645,7 @@ class Transition:
         """True if the transition would cause an actual change in the gate's 
         output.
         """
-        return self.gate.output != self.new_output
+        return not self.cancelled and self.gate.output != self.new_output
     
     def apply(self):
         """Makes this transition effective by changing the gate's output.
@@ -319,10 +654,16 @@ class Transition:
             ValueError: An exception if applying the transition wouldn't cause 
                 an actual change in the gate's output.
         """
-        if self.gate.output == self.new_output:
+        arrays = self.gate.arrays
+        gate_id = self.gate.id
+        if arrays.outputs[gate_id] == self.new_output:
             raise ValueError('Gate output should not transition to the same '
                              'value')
-        self.gate.output = self.new_output
+        arrays.outputs[gate_id] = self.new_output
+        # The output flipped, so flip the matching input bit of every fan-out.
+        out_offsets, out_ids, out_masks = arrays.fan_out()
+        for i in xrange(out_offsets[gate_id], out_offsets[gate_id + 1]):
+            arrays.input_bits[out_ids[i]] ^= out_masks[i]
     
     def __repr__(self):
         # :nodoc: debug output
@@ -422,6 +763,59 @@ class PriorityQueue:
         return min
         
             
+class CalendarQueue:
+    """Calendar queue of Transitions, bucketed by their integer time.
+    
+    Each distinct time has a FIFO bucket, and a small heap holds the distinct
+    times that have pending transitions. Transitions are created right before
+    they are queued, so within a bucket FIFO order is object_id order, and
+    transitions come out in the same order as from PriorityQueue, without ever
+    being compared to each other. Gate delays come from a handful of gate types,
+    so only a few distinct times are ever pending, and both append and pop take
+    O(1) time in practice.
+    """
+    def __init__(self):
+        """Initially empty calendar queue."""
+        self.buckets = {}
+        self.times = []
+        self.length = 0
+    
+    def __len__(self):
+        # Number of elements in the queue.
+        return self.length
+    
+    def append(self, transition):
+        """Inserts a Transition in the queue, after those at the same time."""
+        if transition is None:
+            raise ValueError('Cannot insert None in the queue')
+        bucket = self.buckets.get(transition.time)
+        if bucket is None:
+            bucket = self.buckets[transition.time] = collections.deque()
+            heapq.heappush(self.times, transition.time)
+        bucket.append(transition)
+        self.length += 1
+    
+    def min(self):
+        """The earliest Transition in the queue."""
+        return self.buckets[self.times[0]][0]
+    
+    def pop(self):
+        """Removes the earliest Transition in the queue.
+    
+        Returns:
+            The removed Transition.
+        """
+        if self.length == 0:
+            raise UserWarning("No element in the queue!")
+        time = self.times[0]
+        bucket = self.buckets[time]
+        transition = bucket.popleft()
+        if len(bucket) == 0:
+            del self.buckets[time]
+            heapq.heappop(self.times)
+        self.length -= 1
+        return transition
+
 #    def _find_min(self):
 #        # Computes the index of the minimum element in the queue.
 #        #
@@ -436,10 +830,195 @@ class PriorityQueue:
 #                min = key
 #                self.min_index = i
 
+class ProbeStream:
+    """Writes probe results to a file while a simulation runs.
+    
+    Transitions leave the event queue in time order, but a time's transitions
+    can be applied over several steps (when gates have no delay), and the
+    results are sorted by gate name within a time. So the stream buffers the
+    probe results of the current time, and writes them out sorted, in the same
+    format as Simulation.outputs_to_file, as soon as the step that finishes the
+    time is over, and flushes the file. Only one time's results are ever held
+    in memory.
+    """
+    
+    def __init__(self, file):
+        """Creates a stream that writes probe results to a file.
+        
+        Args:
+            file: A File object that receives the probe results.
+        """
+        self.file = file
+        self.time = None
+        self.pending = []
+    
+    def append(self, probe):
+        """Adds a probe result, a [time, gate name, output] list."""
+        if probe[0] != self.time:
+            self.flush()
+            self.time = probe[0]
+        self.pending.append(probe)
+    
+    def advance(self, time):
+        """Writes out the buffered probe results if they are all known.
+        
+        Args:
+            time: The time of the simulation's next step, or None if the
+                simulation is over.
+        """
+        if self.pending and time != self.time:
+            self.flush()
+    
+    def flush(self):
+        """Writes out the buffered probe results, and flushes the file."""
+        if not self.pending:
+            return
+        self.pending.sort()
+        for probe in self.pending:
+            self.file.write(' '.join([str(probe[0]), probe[1], str(probe[2])]))
+            self.file.write("\n")
+        self.pending = []
+        self.file.flush()
+
+class SimulationStats:
+    """Statistics collected while a simulation runs.
+    
+    Turned on by Simulation.collect_stats; a simulation without stats doesn't
+    pay for them. Every step records how many transitions it took out of the
+    queue, how many of them changed a gate's output (the others were discarded
+    because is_valid was false), how many transitions it queued, the queue's
+    depth when it started, and the time spent applying and propagating
+    transitions. The number of applied transitions is also counted per gate,
+    to find the most active gates.
+    """
+    
+    # The phases of Simulation.run, in order.
+    PHASES = ['start', 'apply', 'propagate', 'output']
+    
+    def __init__(self, arrays):
+        """Creates empty statistics for the gates in a GateArrays."""
+        self.arrays = arrays
+        self.steps = 0
+        self.pushed = 0
+        self.valid = 0
+        self.discarded = 0
+        self.peak_depth = 0
+        self.total_depth = 0
+        # depth_histogram[k] is the number of steps that started with between
+        # 2^k and 2^(k + 1) - 1 transitions in the queue.
+        self.depth_histogram = []
+        self.phase_seconds = dict((phase, 0.0) for phase in self.PHASES)
+        self.run_seconds = 0.0
+        # activity[i] is the number of transitions applied to gate i.
+        self.activity = array.array('l')
+    
+    def add_phase(self, phase, seconds):
+        """Adds the time spent in one of the PHASES."""
+        self.phase_seconds[phase] += seconds
+    
+    def add_step(self, depth, popped, gate_ids, pushed, apply_seconds,
+                 propagate_seconds):
+        """Records one step of the simulation.
+        
+        Args:
+            depth: The number of transitions in the queue before the step.
+            popped: The number of transitions the step took out of the queue.
+            gate_ids: The numbers of the gates whose outputs changed.
+            pushed: The number of transitions the step queued.
+            apply_seconds: The time spent applying the popped transitions.
+            propagate_seconds: The time spent queueing new transitions.
+        """
+        self.steps += 1
+        self.pushed += pushed
+        self.valid += len(gate_ids)
+        self.discarded += popped - len(gate_ids)
+        self.peak_depth = max(self.peak_depth, depth)
+        self.total_depth += depth
+        bucket = depth.bit_length() - 1
+        while len(self.depth_histogram) <= bucket:
+            self.depth_histogram.append(0)
+        self.depth_histogram[bucket] += 1
+        self.phase_seconds['apply'] += apply_seconds
+        self.phase_seconds['propagate'] += propagate_seconds
+        
+        activity = self.activity
+        if len(activity) < len(self.arrays):
+            activity.extend([0] * (len(self.arrays) - len(activity)))
+        for gate_id in gate_ids:
+            activity[gate_id] += 1
+    
+    def top_gates(self, count):
+        """The most active gates.
+        
+        Args:
+            count: The number of gates to return.
+        
+        Returns:
+            A list of up to count [gate name, applied transitions] lists, most
+            active first, with ties broken by gate name.
+        """
+        names = self.arrays.names
+        activity = self.activity
+        top = heapq.nsmallest(count, xrange(len(activity)),
+                              key=lambda i: (-activity[i], names[i]))
+        return [[names[i], activity[i]] for i in top if activity[i] > 0]
+    
+    def as_json(self, top_count=10):
+        """A hash that obeys the JSON format, representing the statistics.
+        
+        Args:
+            top_count: The number of most active gates to include.
+        """
+        return {
+            'steps': self.steps,
+            'seconds': self.run_seconds,
+            'steps_per_second': self.steps / max(self.run_seconds, 1e-9),
+            'events_pushed': self.pushed,
+            'transitions_valid': self.valid,
+            'transitions_discarded': self.discarded,
+            'queue_depth': {
+                'peak': self.peak_depth,
+                'average': float(self.total_depth) / max(self.steps, 1),
+                'histogram': [[1 << k, (2 << k) - 1, steps]
+                              for k, steps in enumerate(self.depth_histogram)]
+            },
+            'phase_seconds': dict(self.phase_seconds),
+            'top_gates': self.top_gates(top_count)
+        }
+    
+    def flame_lines(self):
+        """The time per phase, as a folded-stack flame graph listing.
+        
+        Each line is a semicolon-separated stack of frames, followed by the
+        number of microseconds spent in it, which is the input format of
+        flamegraph.pl and most flame graph viewers.
+        """
+        # Time in run that isn't in any of the phases, e.g. the loop itself.
+        other_seconds = self.run_seconds - sum(self.phase_seconds.values())
+        lines = ['run %d' % int(max(other_seconds, 0) * 1e6)]
+        for phase in self.PHASES:
+            frames = ['run', phase]
+            if phase == 'apply' or phase == 'propagate':
+                frames.insert(1, 'step')
+            lines.append('%s %d' % (';'.join(frames),
+                                    int(self.phase_seconds[phase] * 1e6)))
+        return lines
+
 class Simulation:
-    """State needed to compute a circuit's state as it evolves over time."""
+    """State needed to compute a circuit's state as it evolves over time.
     
-    def __init__(self, circuit):
+    By default, gates have transport delays: every input change queues a
+    transition of the gate's output, and transitions that turn out not to
+    change anything are discarded when they leave the queue. In inertial delay
+    mode, each gate has at most one transition waiting in the queue (see
+    Gate.pending). A newer transition of the gate's output replaces it in place
+    if it is due at the same time, and otherwise cancels it, so pulses shorter
+    than a gate's delay never make it to the gate's output. Cancelled
+    transitions stay in the queue until they are popped, but transitions that
+    would not change the gate's output are never queued.
+    """
+    
+    def __init__(self, circuit, queue_class=PriorityQueue, inertial=False):
         """Creates a simulation that will run on a pre-built circuit.
         
         The Circuit instance does not need to be completely built before it is 
@@ -448,12 +1027,20 @@ class Simulation:
         
         Args:
             circuit: The circuit whose state transitions will be simulated.
+            queue_class: The event queue implementation, PriorityQueue or
+                CalendarQueue.
+            inertial: True to simulate gates with inertial delays, instead of
+                transport delays.
         """
         self.circuit = circuit
+        self.inertial = inertial
         self.in_transitions = []
         
-        self.queue = PriorityQueue()
+        self.queue_class = queue_class
+        self.queue = queue_class()
         self.probes = []
+        self.probe_stream = None
+        self.stats = None
         self.probe_all_undo_log = []
 
     def add_transition(self, gate_name, output_value, output_time):
@@ -474,37 +1061,155 @@ class Simulation:
         Returns:
             The simulation time after the step occurred.
         """ 
+        # The gates are stepped through their GateArrays, by gate number.
+        arrays = self.circuit.arrays
+        outputs = arrays.outputs
+        input_bits = arrays.input_bits
+        out_offsets, out_ids, out_masks = arrays.fan_out()
         step_time = self.queue.min().time
+        stats = self.stats
+        if stats is not None:
+          start_depth = len(self.queue)
+          start_seconds = timeit.default_timer()
         
         # Need to apply all the transitions at the same time before propagating.
-        transitions = []
+        gate_ids = []
         while len(self.queue) > 0 and self.queue.min().time == step_time:
           transition = self.queue.pop()
-          if not transition.is_valid():
+          gate_id = transition.gate.id
+          if self.inertial and arrays.pending.get(gate_id) is transition:
+            del arrays.pending[gate_id]
+          # Same as transition.is_valid() and transition.apply().
+          if (transition.cancelled or
+              outputs[gate_id] == transition.new_output):
             continue
-          transition.apply()
-          if transition.gate.probed:
-            self.probes.append([transition.time, transition.gate.name,
-                                transition.new_output])
-          transitions.append(transition)
+          outputs[gate_id] = transition.new_output
+          for i in xrange(out_offsets[gate_id], out_offsets[gate_id + 1]):
+            input_bits[out_ids[i]] ^= out_masks[i]
+          if arrays.probed[gate_id]:
+            probe = [transition.time, arrays.names[gate_id],
+                     transition.new_output]
+            if self.probe_stream is None:
+              self.probes.append(probe)
+            else:
+              self.probe_stream.append(probe)
+          gate_ids.append(gate_id)
+        if stats is not None:
+          popped_depth = len(self.queue)
+          apply_seconds = timeit.default_timer()
         
         # Propagate the transition effects.
-        for transition in transitions:
-          for gate in transition.gate.out_gates:
-            output = gate.transition_output()
-            time = gate.transition_time(step_time)
-            self.queue.append(Transition(gate, output, time))
+        if self.inertial:
+          self._propagate_inertial(gate_ids, step_time)
+        else:
+          self._propagate(gate_ids, step_time)
         
+        if stats is not None:
+          stats.add_step(start_depth, start_depth - popped_depth, gate_ids,
+                         len(self.queue) - popped_depth,
+                         apply_seconds - start_seconds,
+                         timeit.default_timer() - apply_seconds)
+        if self.probe_stream is not None:
+          self.probe_stream.advance(self.queue.min().time
+                                    if len(self.queue) > 0 else None)
         return step_time
     
-    def run(self):
-        """Runs the simulation to completion."""
+    def _propagate(self, gate_ids, step_time):
+        # Queues the effects of the applied transitions.
+        arrays = self.circuit.arrays
+        input_bits = arrays.input_bits
+        tables = arrays.tables
+        table_ids = arrays.table_ids
+        delays = arrays.delays
+        gate = arrays.gate
+        out_offsets, out_ids, out_masks = arrays.fan_out()
+        for gate_id in gate_ids:
+          for i in xrange(out_offsets[gate_id], out_offsets[gate_id + 1]):
+            out_id = out_ids[i]
+            output = tables[table_ids[out_id]][input_bits[out_id]]
+            time = step_time + delays[out_id]
+            self.queue.append(Transition(gate(out_id), output, time))
+    
+    def _propagate_inertial(self, gate_ids, step_time):
+        # Queues the effects of the applied transitions in inertial delay mode.
+        #
+        # A gate's delay doesn't change, so a new transition is never due before
+        # the gate's pending transition.
+        arrays = self.circuit.arrays
+        pending_transitions = arrays.pending
+        input_bits = arrays.input_bits
+        out_offsets, out_ids, out_masks = arrays.fan_out()
+        for gate_id in gate_ids:
+          for i in xrange(out_offsets[gate_id], out_offsets[gate_id + 1]):
+            out_id = out_ids[i]
+            output = arrays.tables[arrays.table_ids[out_id]][input_bits[out_id]]
+            time = step_time + arrays.delays[out_id]
+            pending = pending_transitions.get(out_id)
+            if pending is not None:
+              if pending.time == time:
+                pending.new_output = output
+                continue
+              pending.cancelled = True
+              del pending_transitions[out_id]
+            if output != arrays.outputs[out_id]:
+              pending = Transition(arrays.gate(out_id), output, time)
+              pending_transitions[out_id] = pending
+              self.queue.append(pending)
+    
+    def start(self):
+        """Queues the transitions in the simulation's initial conditions.
+        
+        Called by run, before the first step.
+        """
+        if self.stats is not None:
+            start_seconds = timeit.default_timer()
         for in_transition in sorted(self.in_transitions):
             self.queue.append(Transition(in_transition[3], in_transition[2],
                                          in_transition[0]))
+        if self.stats is not None:
+            self.stats.pushed += len(self.in_transitions)
+            self.stats.add_phase('start',
+                                 timeit.default_timer() - start_seconds)
+    
+    def run(self):
+        """Runs the simulation to completion."""
+        start_seconds = timeit.default_timer()
+        self.start()
         while len(self.queue) > 0:
             self.step()
-        self.probes.sort()
+        output_seconds = timeit.default_timer()
+        if self.probe_stream is None:
+            self.probes.sort()
+        else:
+            self.probe_stream.flush()
+        if self.stats is not None:
+            end_seconds = timeit.default_timer()
+            self.stats.add_phase('output', end_seconds - output_seconds)
+            self.stats.run_seconds += end_seconds - start_seconds
+    
+    def collect_stats(self):
+        """Turns on the collection of statistics about the simulation.
+        
+        Must be called before run.
+        
+        Returns:
+            The SimulationStats instance that is filled in while the simulation
+            runs.
+        """
+        self.stats = SimulationStats(self.circuit.arrays)
+        return self.stats
+    
+    def stream_outputs_to_file(self, file):
+        """Writes the simulation's probe results to a file while it runs.
+        
+        Must be called before run. The results are written in the same format
+        as outputs_to_file, as soon as they are known, and are not kept in
+        self.probes.
+        
+        Args:
+            file: A File object that receives the probe results.
+        """
+        self.probe_stream = ProbeStream(file)
             
     def probe_all_gates(self):
         """Turns on probing for all gates in the simulation."""
@@ -520,19 +1225,25 @@ class Simulation:
         self.probe_all_undo_log = []
     
     @staticmethod
-    def from_file(file):
+    def from_file(file, queue_class=PriorityQueue, inertial=False):
         """Builds a simulation by reading a textual description from a file.
         
         Args:
             file: A File object supplying the input.
+            queue_class: The event queue implementation, PriorityQueue or
+                CalendarQueue.
+            inertial: True to simulate gates with inertial delays.
         
         Returns: A new Simulation instance.
         """
         circuit = Circuit()
-        simulation = Simulation(circuit)
+        simulation = Simulation(circuit, queue_class, inertial)
         
         while True:
-            command = file.readline().split()
+            line = file.readline()
+            if len(line) == 0:
+                raise ValueError('Input lacks the done command')
+            command = line.split()
             if len(command) < 1:
                 continue
             if command[0] == 'table':
@@ -612,17 +1323,1160 @@ class Simulation:
         json.dump(self.trace_as_json(), file)
         file.write(');\n')
 
+class Netlist:
+    """A circuit description parsed into flat arrays, with names as integer ids.
+    
+    Reading a Netlist does not build any Gate objects, so it can be saved in a
+    compact binary form and loaded back without parsing text. The names of the
+    truth tables, gate types and gates are interned into integer ids (their
+    positions in table_names, type_names and gate_names), and the connections
+    are stored in compressed sparse row form: the inputs of gate i are the ids
+    input_ids[input_offsets[i]:input_offsets[i + 1]].
+    """
+    
+    # Identifies binary netlist files, and the version of their format.
+    MAGIC = b'CKT1'
+    
+    def __init__(self):
+        """Creates an empty netlist."""
+        self.table_names = []
+        self.table_offsets = array.array('l', [0])
+        self.table_entries = bytearray()
+        self.type_names = []
+        self.type_tables = array.array('l')
+        self.type_delays = array.array('l')
+        self.gate_names = []
+        self.gate_types = array.array('l')
+        self.input_offsets = array.array('l', [0])
+        self.input_ids = array.array('l')
+        self.probe_ids = array.array('l')
+        self.flip_gates = array.array('l')
+        self.flip_outputs = array.array('l')
+        self.flip_times = array.array('l')
+    
+    @staticmethod
+    def parse(text):
+        """Parses a textual circuit description, in the format read by
+        Simulation.from_file, up to its done command.
+        
+        Args:
+            text: A string holding the whole description.
+        
+        Returns:
+            A new Netlist instance.
+        
+        Raises:
+            ValueError: An exception if the description is invalid or lacks the
+                done command.
+        """
+        netlist = Netlist()
+        table_ids = {}
+        type_ids = {}
+        gate_ids = {}
+        input_ids = netlist.input_ids
+        
+        for line in text.splitlines():
+            command = line.split()
+            if len(command) < 1:
+                continue
+            if command[0] == 'gate':
+                if command[1] in gate_ids:
+                    raise ValueError('Gate name already used')
+                gate_ids[command[1]] = len(netlist.gate_names)
+                netlist.gate_names.append(command[1])
+                netlist.gate_types.append(type_ids[command[2]])
+                input_ids.extend([gate_ids[name] for name in command[3:]])
+                netlist.input_offsets.append(len(input_ids))
+            elif command[0] == 'flip':
+                if len(command) != 4:
+                    raise ValueError('Invalid number of arguments for flip '
+                                     'command')
+                netlist.flip_gates.append(gate_ids[command[1]])
+                netlist.flip_outputs.append(int(command[2]))
+                netlist.flip_times.append(int(command[3]))
+            elif command[0] == 'probe':
+                if len(command) != 2:
+                    raise ValueError('Invalid number of arguments for gate '
+                                      'probe command')
+                netlist.probe_ids.append(gate_ids[command[1]])
+            elif command[0] == 'table':
+                if command[1] in table_ids:
+                    raise ValueError('Truth table name already used')
+                table_ids[command[1]] = len(netlist.table_names)
+                netlist.table_names.append(command[1])
+                netlist.table_entries.extend(
+                    [int(token) for token in command[2:]])
+                netlist.table_offsets.append(len(netlist.table_entries))
+            elif command[0] == 'type':
+                if len(command) != 4:
+                    raise ValueError('Invalid number of arguments for gate type'
+                                     ' command')
+                if command[1] in type_ids:
+                    raise ValueError('Gate type name already used')
+                type_ids[command[1]] = len(netlist.type_names)
+                netlist.type_names.append(command[1])
+                netlist.type_tables.append(table_ids[command[2]])
+                netlist.type_delays.append(int(command[3]))
+            elif command[0] == 'done':
+                return netlist
+        raise ValueError('Input lacks the done command')
+    
+    def to_simulation(self, queue_class=PriorityQueue, inertial=False):
+        """Builds a Simulation of the circuit described by this netlist.
+        
+        Args:
+            queue_class: The event queue implementation, PriorityQueue or
+                CalendarQueue.
+            inertial: True to simulate gates with inertial delays.
+        
+        Returns:
+            A new Simulation instance.
+        """
+        circuit = Circuit()
+        offsets = self.table_offsets
+        for i, name in enumerate(self.table_names):
+            circuit.add_truth_table(
+                name, list(self.table_entries[offsets[i]:offsets[i + 1]]))
+        for i, name in enumerate(self.type_names):
+            circuit.add_gate_type(name, self.table_names[self.type_tables[i]],
+                                  self.type_delays[i])
+        
+        # Netlist gate numbers are the same as GateArrays gate numbers.
+        gate_types = [circuit.gate_types[name] for name in self.type_names]
+        arrays = circuit.arrays
+        offsets = self.input_offsets
+        for i, name in enumerate(self.gate_names):
+            arrays.add(name, gate_types[self.gate_types[i]])
+            for terminal in xrange(offsets[i + 1] - offsets[i]):
+                arrays.connect(i, self.input_ids[offsets[i] + terminal],
+                               terminal)
+        for i in self.probe_ids:
+            arrays.gate(i).probe()
+        
+        simulation = Simulation(circuit, queue_class, inertial)
+        for i in xrange(len(self.flip_gates)):
+            simulation.add_transition(self.gate_names[self.flip_gates[i]],
+                                      self.flip_outputs[i], self.flip_times[i])
+        return simulation
+    
+    def _sections(self):
+        # The names lists and arrays that make up a netlist, in file order.
+        return [self.table_names, self.type_names, self.gate_names,
+                self.table_offsets, self.table_entries, self.type_tables,
+                self.type_delays, self.gate_types, self.input_offsets,
+                self.input_ids, self.probe_ids, self.flip_gates,
+                self.flip_outputs, self.flip_times]
+    
+    def save(self, file):
+        """Writes the netlist to a binary file.
+        
+        The file uses the machine's byte order and integer size, so it is only
+        meant to be read back on the same kind of machine, e.g. as a cache.
+        
+        Args:
+            file: A File object opened for writing in binary mode.
+        """
+        file.write(Netlist.MAGIC)
+        file.write(struct.pack('<B', array.array('l').itemsize))
+        for section in self._sections():
+            if isinstance(section, list):
+                data = '\n'.join(section).encode('utf-8')
+            elif isinstance(section, bytearray):
+                data = bytes(section)
+            elif hasattr(section, 'tobytes'):
+                data = section.tobytes()
+            else:
+                data = section.tostring()  # Python 2 arrays lack tobytes.
+            file.write(struct.pack('<Q', len(data)))
+            file.write(data)
+    
+    @staticmethod
+    def load(file):
+        """Reads a netlist written by save.
+        
+        Args:
+            file: A File object opened for reading in binary mode.
+        
+        Returns:
+            A new Netlist instance.
+        
+        Raises:
+            ValueError: An exception if the file is not a netlist written by
+                save on this kind of machine.
+        """
+        header = file.read(len(Netlist.MAGIC) + 1)
+        if header != Netlist.MAGIC + struct.pack('<B',
+                                                 array.array('l').itemsize):
+            raise ValueError('Not a compiled netlist for this machine')
+        netlist = Netlist()
+        for section in netlist._sections():
+            size = file.read(8)
+            if len(size) != 8:
+                raise ValueError('Truncated compiled netlist')
+            size = struct.unpack('<Q', size)[0]
+            data = file.read(size)
+            if len(data) != size:
+                raise ValueError('Truncated compiled netlist')
+            if isinstance(section, list):
+                if not isinstance(data, str):
+                    data = data.decode('utf-8')
+                if size > 0:
+                    section.extend(data.split('\n'))
+            elif isinstance(section, bytearray):
+                section.extend(data)
+            else:
+                del section[:]
+                if hasattr(section, 'frombytes'):
+                    section.frombytes(data)
+                else:
+                    section.fromstring(data)  # Python 2 arrays lack frombytes.
+        return netlist
+    
+    @staticmethod
+    def from_cache(data, cache_dir):
+        """Parses a textual circuit description, using a cache of netlists.
+        
+        The netlist is looked up in the cache by a hash of the description. On
+        a miss, the description is parsed, and its netlist is saved in the
+        cache, so the next run on the same description doesn't parse it.
+        
+        Args:
+            data: The whole description, as bytes.
+            cache_dir: The directory holding the cached netlists.
+        
+        Returns:
+            A Netlist instance.
+        """
+        path = os.path.join(cache_dir, hashlib.sha1(data).hexdigest() + '.ckt')
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as file:
+                    return Netlist.load(file)
+            except ValueError:
+                pass
+        
+        if not isinstance(data, str):
+            data = data.decode('utf-8')
+        netlist = Netlist.parse(data)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary file first, so that concurrent runs never see a
+        # partial netlist.
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as file:
+            netlist.save(file)
+        os.rename(temp_path, path)
+        return netlist
+
+class LevelizedCircuit:
+    """A combinational circuit compiled for zero-delay evaluation.
+    
+    The gates are sorted topologically once, and the netlist is compiled into
+    straight-line Python code that computes every gate's output from its inputs'
+    outputs, in that order. Evaluating an input vector then runs the generated
+    code once, with no event queue and no Transitions, and yields the values
+    that the gates' outputs settle to. Gate delays are ignored, so the circuit
+    must not have cycles.
+    """
+    
+    # Number of gates evaluated by each generated function. Keeps the generated
+    # functions small enough to compile quickly.
+    chunk_size = 4096
+    
+    def __init__(self, circuit):
+        """Compiles a complete circuit.
+        
+        Args:
+            circuit: The Circuit to compile.
+        
+        Raises:
+            ValueError: An exception if the circuit has a cycle.
+        """
+        self.circuit = circuit
+        self.gates = self._levelize(circuit)
+        self.gate_ids = dict((gate.name, i)
+                             for i, gate in enumerate(self.gates))
+        self.input_ids = [i for i, gate in enumerate(self.gates)
+                          if not gate.has_inputs_connected()]
+        self.probe_ids = [i for i, gate in enumerate(self.gates) if gate.probed]
+        self._chunks = self._compile()
+    
+    @staticmethod
+    def _levelize(circuit):
+        # Sorts the circuit's gates so that every gate comes after the gates
+        # driving its inputs. Gates with unconnected inputs are the circuit's
+        # inputs, and come first.
+        #
+        # Raises:
+        #    ValueError: An exception if the circuit has a cycle.
+        gates = list(circuit.gates.values())
+        order = [gate for gate in gates if not gate.has_inputs_connected()]
+        pending = {}
+        for gate in gates:
+            if gate.has_inputs_connected():
+                pending[gate] = len(gate.in_gates)
+                if pending[gate] == 0:
+                    order.append(gate)
+        i = 0
+        while i < len(order):
+            for out_gate in order[i].out_gates:
+                if out_gate in pending:
+                    pending[out_gate] -= 1
+                    if pending[out_gate] == 0:
+                        order.append(out_gate)
+            i += 1
+        if len(order) != len(gates):
+            raise ValueError('Circuit has a cycle')
+        return order
+    
+    def _compile(self):
+        # Generates and compiles the evaluation code, one function per chunk of
+        # chunk_size gates. Each function takes the list of gate outputs and a
+        # mask of the bits in use, and fills in the outputs of its gates.
+        self._tables = []
+        self._table_ids = {}
+        lines = [self._gate_code(i, gate) for i, gate in enumerate(self.gates)
+                 if gate.has_inputs_connected()]
+        
+        namespace = {'tables': self._tables}
+        chunks = []
+        for start in xrange(0, len(lines), self.chunk_size):
+            source = ['def chunk(v, m):']
+            source.extend('  t%d = tables[%d]' % (t, t)
+                          for t in xrange(len(self._tables)))
+            source.extend('  ' + line
+                          for line in lines[start:start + self.chunk_size])
+            exec(compile('\n'.join(source) + '\n', '<levelized>', 'exec'),
+                 namespace)
+            chunks.append(namespace['chunk'])
+        return chunks
+    
+    def _gate_code(self, i, gate):
+        # A line of Python that computes v[i], the output of the given gate,
+        # from the outputs of its inputs, by looking it up in a flat table.
+        table = gate.gate_type.truth_table
+        if table.name not in self._table_ids:
+            self._table_ids[table.name] = len(self._tables)
+            self._tables.append(table.flat_table)
+        count = len(gate.in_gates)
+        terms = ['v[%d] << %d' % (self.gate_ids[in_gate.name],
+                                  count - 1 - terminal)
+                 for terminal, in_gate in enumerate(gate.in_gates)]
+        return 'v[%d] = t%d[%s]' % (i, self._table_ids[table.name],
+                                    ' | '.join(terms))
+    
+    def evaluate(self, inputs):
+        """Computes the settled outputs of all the gates for an input vector.
+        
+        Args:
+            inputs: A dict mapping input gate names to their 0/1 outputs. Input
+                gates that are not in the dict output 0.
+        
+        Returns:
+            A bytearray of gate outputs, in the order of self.gates.
+        
+        Raises:
+            ValueError: An exception if a name is not an input gate's.
+        """
+        values = bytearray(len(self.gates))
+        for name, value in inputs.items():
+            i = self.gate_ids.get(name)
+            if i is None or self.gates[i].has_inputs_connected():
+                raise ValueError('Not an input gate: ' + name)
+            values[i] = value
+        for chunk in self._chunks:
+            chunk(values, 1)
+        return values
+    
+    def probe_outputs(self, values):
+        """The outputs of the probed gates, as a dict from gate names to values.
+        
+        Args:
+            values: A bytearray returned by evaluate.
+        """
+        return dict((self.gates[i].name, values[i]) for i in self.probe_ids)
+    
+    @staticmethod
+    def settled_inputs(simulation):
+        """The input vector that a simulation's flips leave the inputs at.
+        
+        Returns:
+            A dict mapping input gate names to the value of their last flip.
+        """
+        inputs = {}
+        for in_transition in sorted(in_transition[:3] for in_transition
+                                    in simulation.in_transitions):
+            inputs[in_transition[1]] = in_transition[2]
+        return inputs
+
+class BitParallelCircuit(LevelizedCircuit):
+    """A combinational circuit compiled to evaluate many input vectors at once.
+    
+    Like LevelizedCircuit, but each gate's output is an integer with one bit per
+    input vector, and each gate is evaluated with the bitwise expression derived
+    from its truth table. One pass through the generated code evaluates as many
+    input vectors as there are bits in the integers, with no per-vector work
+    except packing the inputs and unpacking the probed outputs.
+    
+    evaluate_all only yields the settled outputs, ignoring gate delays. run_all
+    simulates timed flips with gate delays, for as many simulations at once,
+    and gives the same probe results as Simulation.run, unless the inputs make
+    the probes depend on the event order, which it rejects.
+    """
+    
+    # Number of input vectors evaluated by each pass.
+    width = 1024
+    
+    def _gate_code(self, i, gate):
+        # A line of Python that computes v[i], the outputs of the given gate,
+        # from the outputs of its inputs, with bitwise operators.
+        names = ['v[%d]' % self.gate_ids[in_gate.name]
+                 for in_gate in gate.in_gates]
+        return 'v[%d] = %s' % (i, gate.gate_type.truth_table.bitwise_expression(
+            names))
+    
+    def evaluate_words(self, words, count):
+        """Computes the settled outputs of all the gates for many input vectors.
+        
+        Args:
+            words: A dict mapping input gate names to integers whose bit j is
+                the gate's output in input vector j. Input gates that are not in
+                the dict output 0.
+            count: The number of input vectors.
+        
+        Returns:
+            A list of integers holding the gate outputs, in the order of
+            self.gates, with bit j holding the output for input vector j.
+        
+        Raises:
+            ValueError: An exception if a name is not an input gate's.
+        """
+        mask = (1 << count) - 1
+        values = [0] * len(self.gates)
+        for name, word in words.items():
+            i = self.gate_ids.get(name)
+            if i is None or self.gates[i].has_inputs_connected():
+                raise ValueError('Not an input gate: ' + name)
+            values[i] = word & mask
+        for chunk in self._chunks:
+            chunk(values, mask)
+        return values
+    
+    def evaluate_all(self, input_list):
+        """Computes the settled outputs of the probed gates for input vectors.
+        
+        Args:
+            input_list: A list of dicts mapping input gate names to their 0/1
+                outputs, as taken by LevelizedCircuit.evaluate.
+        
+        Returns:
+            A list with a dict for each input vector, mapping the probed gates'
+            names to their settled outputs.
+        """
+        results = []
+        for start in xrange(0, len(input_list), self.width):
+            batch = input_list[start:start + self.width]
+            words = {}
+            for j, inputs in enumerate(batch):
+                for name, value in inputs.items():
+                    words[name] = words.get(name, 0) | (value << j)
+            values = self.evaluate_words(words, len(batch))
+            probes = [(self.gates[i].name, values[i]) for i in self.probe_ids]
+            for j in xrange(len(batch)):
+                results.append(dict((name, (word >> j) & 1)
+                                    for name, word in probes))
+        return results
+    
+    def run_all(self, flips_list):
+        """Simulates the circuit once for each set of initial conditions.
+        
+        Each gate's output is kept as a waveform, a list of (time, integer)
+        changes with one bit per simulation, which is computed from the
+        waveforms of the gate's inputs and the gate's delay. A gate is only
+        re-evaluated for the simulations where one of its inputs changed, so the
+        results match Simulation.run with transport delays, including glitches.
+        Inertial delays are not supported.
+        
+        The simulations are timing-dependent when a gate that has inputs has no
+        delay, or when a gate is flipped twice at the same time: their probes
+        depend on the order that the event queue applies transitions in, which
+        waveforms do not model. Those inputs are rejected.
+        
+        Args:
+            flips_list: A list of flips lists, as taken by CompiledCircuit.run.
+        
+        Returns:
+            A list with the probe results of each simulation, as returned by
+            CompiledCircuit.run.
+        
+        Raises:
+            ValueError: An exception if the circuit or a flips list is
+                timing-dependent, if a flip is for a gate that is not an input,
+                or if a flip's output is not 0 or 1.
+        """
+        for gate in self.gates:
+            if gate.has_inputs_connected() and gate.gate_type.delay == 0:
+                raise ValueError('Gate %s has no delay, so its outputs depend '
+                                 'on the event order' % gate.name)
+        functions = {}
+        for gate in self.gates:
+            table = gate.gate_type.truth_table
+            if gate.has_inputs_connected() and table.name not in functions:
+                names = ['x%d' % i for i in xrange(table.input_count)]
+                functions[table.name] = eval('lambda %s, m: %s' % (
+                    ', '.join(names), table.bitwise_expression(names)))
+        
+        results = []
+        for start in xrange(0, len(flips_list), self.width):
+            batch = flips_list[start:start + self.width]
+            waveforms = self._run_words(batch, functions)
+            probes = [[] for flips in batch]
+            for i in self.probe_ids:
+                name = self.gates[i].name
+                word = 0
+                for time, new_word in waveforms[i]:
+                    changed = word ^ new_word
+                    word = new_word
+                    while changed:
+                        bit = changed & -changed
+                        changed ^= bit
+                        j = bit.bit_length() - 1
+                        probes[j].append([time, name, (word >> j) & 1])
+            for probe_list in probes:
+                probe_list.sort()
+            results.extend(probes)
+        return results
+    
+    def _run_words(self, batch, functions):
+        # Computes the waveforms of all the gates for a batch of at most width
+        # flips lists, in the order of self.gates. Every gate starts at 0.
+        mask = (1 << len(batch)) - 1
+        # Input gate number -> time -> (bits flipped, their new outputs).
+        flipped = {}
+        for j, flips in enumerate(batch):
+            bit = 1 << j
+            for name, output, time in flips:
+                i = self.gate_ids.get(name)
+                if i is None or self.gates[i].has_inputs_connected():
+                    raise ValueError('Not an input gate: ' + name)
+                if output != 0 and output != 1:
+                    raise ValueError('Invalid output value')
+                changes = flipped.setdefault(i, {})
+                bits, outputs = changes.get(time, (0, 0))
+                if bits & bit:
+                    raise ValueError('Gate %s is flipped twice at time %d, so '
+                                     'its outputs depend on the event order' %
+                                     (name, time))
+                changes[time] = (bits | bit, outputs | (output << j))
+        
+        waveforms = [None] * len(self.gates)
+        for i in self.input_ids:
+            waveform = []
+            word = 0
+            for time, (bits, outputs) in sorted(flipped.get(i, {}).items()):
+                new_word = (word & ~bits) | outputs
+                if new_word != word:
+                    word = new_word
+                    waveform.append((time, word))
+            waveforms[i] = waveform
+        
+        for i, gate in enumerate(self.gates):
+            if waveforms[i] is not None:
+                continue
+            function = functions[gate.gate_type.truth_table.name]
+            delay = gate.gate_type.delay
+            in_waveforms = [waveforms[self.gate_ids[in_gate.name]]
+                            for in_gate in gate.in_gates]
+            # Every input change, as (time, input terminal, new output).
+            changes = sorted((time, terminal, word) for terminal, in_waveform
+                             in enumerate(in_waveforms)
+                             for time, word in in_waveform)
+            words = [0] * len(in_waveforms)
+            waveform = []
+            output = 0
+            k = 0
+            while k < len(changes):
+                time = changes[k][0]
+                changed = 0
+                while k < len(changes) and changes[k][0] == time:
+                    terminal, word = changes[k][1], changes[k][2]
+                    changed |= words[terminal] ^ word
+                    words[terminal] = word
+                    k += 1
+                new_output = ((function(*(words + [mask])) & changed) |
+                              (output & ~changed))
+                if new_output != output:
+                    output = new_output
+                    waveform.append((time + delay, output))
+            waveforms[i] = waveform
+        return waveforms
+
+class OutboxQueue:
+    """Event queue that keeps a copy of the transitions of some gates.
+    
+    Wraps another queue, and behaves exactly like it, except that transitions of
+    the gates in outbox are also appended to outbox[gate.name] as they are
+    queued. Used by PartitionWorker to learn about the future transitions of
+    gates that drive other partitions.
+    """
+    
+    def __init__(self, queue, outbox, gates):
+        """Wraps a queue.
+        
+        Args:
+            queue: The queue to wrap.
+            outbox: A dict mapping gate names to lists of transitions.
+            gates: The Gate instances whose transitions go in the outbox.
+        """
+        self.queue = queue
+        self.outbox = outbox
+        self.gates = set(gates)
+    
+    def __len__(self):
+        return len(self.queue)
+    
+    def append(self, transition):
+        """Inserts a Transition in the queue, and maybe in the outbox."""
+        if transition.gate in self.gates:
+            self.outbox[transition.gate.name].append(transition)
+        self.queue.append(transition)
+    
+    def min(self):
+        """The earliest Transition in the queue."""
+        return self.queue.min()
+    
+    def pop(self):
+        """Removes the earliest Transition in the queue, and returns it."""
+        return self.queue.pop()
+
+class PartitionWorker:
+    """Simulates one partition of a PartitionedSimulation.
+    
+    The partition's circuit has the partition's own gates, plus a copy of every
+    gate in another partition that drives one of them. The copies have no
+    inputs connected, like the circuit's input gates, and their transitions are
+    delivered by the other partitions, through inject.
+    """
+    
+    def __init__(self, text, cut_drivers, queue_class):
+        """Builds the partition's simulation, and queues its initial conditions.
+        
+        Args:
+            text: A textual description of the partition's circuit, in the
+                format read by Simulation.from_file.
+            cut_drivers: A dict mapping the names of the partition's gates that
+                drive gates in other partitions to lists of those partitions'
+                numbers.
+            queue_class: The event queue implementation.
+        """
+        self.simulation = Netlist.parse(text).to_simulation(queue_class)
+        self.cut_drivers = cut_drivers
+        self.outbox = dict((name, []) for name in cut_drivers)
+        # The outputs of the cut drivers, as of the transitions sent so far.
+        self.sent_outputs = dict((name, 0) for name in cut_drivers)
+        gates = [self.simulation.circuit.gates[name] for name in cut_drivers]
+        self.simulation.queue = OutboxQueue(self.simulation.queue, self.outbox,
+                                            gates)
+        self.simulation.start()
+    
+    def next_time(self):
+        """The time of the partition's next transition, or None."""
+        if len(self.simulation.queue) == 0:
+            return None
+        return self.simulation.queue.min().time
+    
+    def collect(self, end_time):
+        """The output changes of the cut drivers that happen before end_time.
+        
+        All the transitions that can happen before end_time must already be
+        queued. They are taken out of the outbox and checked in queue order,
+        the way step will check them, to only keep those that change outputs.
+        
+        Returns:
+            A dict mapping partition numbers to lists of (time, gate name, new
+            output) changes that they need, in time order.
+        """
+        messages = {}
+        for name, transitions in self.outbox.items():
+            ready = sorted(transition for transition in transitions
+                           if transition.time < end_time)
+            if len(ready) == 0:
+                continue
+            self.outbox[name] = [transition for transition in transitions
+                                 if transition.time >= end_time]
+            output = self.sent_outputs[name]
+            for transition in ready:
+                if transition.new_output == output:
+                    continue
+                output = transition.new_output
+                for partition in self.cut_drivers[name]:
+                    messages.setdefault(partition, []).append(
+                        (transition.time, name, output))
+            self.sent_outputs[name] = output
+        return messages
+    
+    def run(self, end_time, changes):
+        """Delivers output changes from other partitions, then runs the steps
+        that happen before end_time.
+        
+        Args:
+            end_time: The time where the partition has to stop, or None to run
+                to completion.
+            changes: A list of (time, gate name, new output) changes of gates
+                in other partitions, in time order.
+        
+        Returns:
+            The time of the partition's next transition, or None.
+        """
+        gates = self.simulation.circuit.gates
+        for time, name, output in changes:
+            self.simulation.queue.append(Transition(gates[name], output, time))
+        queue = self.simulation.queue
+        while len(queue) > 0 and (end_time is None or
+                                  queue.min().time < end_time):
+            self.simulation.step()
+        return self.next_time()
+    
+    def probes(self):
+        """The probe results recorded by the partition, in no specific order."""
+        return self.simulation.probes
+
+def partition_worker_main(connection, text, cut_drivers, queue_class):
+    """Serves the methods of a PartitionWorker over a multiprocessing pipe.
+    
+    Receives (method name, arguments) pairs, and sends back the results, until
+    it receives a None method name.
+    """
+    try:
+        worker = PartitionWorker(text, cut_drivers, queue_class)
+    except Exception as error:
+        worker = error
+    while True:
+        method, args = connection.recv()
+        if method is None:
+            break
+        try:
+            if isinstance(worker, Exception):
+                raise worker
+            connection.send(getattr(worker, method)(*args))
+        except Exception as error:
+            connection.send(error)
+    connection.close()
+
+class PartitionedSimulation:
+    """Runs a simulation with several processes, one per part of the circuit.
+    
+    The gates are split into partitions of consecutive gates in topological
+    order, and each partition is simulated by a PartitionWorker in its own
+    process. The partitions move forward in lock step, one time window at a
+    time, using a conservative protocol: a window starts at the time of the
+    earliest pending transition, and lasts as long as the lookahead, the
+    smallest delay of a gate that drives another partition. All of a driver's
+    transitions inside a window are queued before it starts, so they are sent
+    to the partitions that need them at the start of the window, and each
+    partition then runs the window on its own.
+    
+    A gate with no delay is kept in the same partition as the gates it drives,
+    so the lookahead is never 0. Gates with no inputs connected (the circuit's
+    inputs) only change because of flips, so they are copied into every
+    partition that uses them. The probe results are the same as those of
+    Simulation.run, in the same order.
+    """
+    
+    def __init__(self, simulation, partition_count):
+        """Splits a simulation's circuit into partitions.
+        
+        Args:
+            simulation: The Simulation to run. Its circuit must be complete.
+            partition_count: The number of partitions to split the circuit
+                into. There can be fewer, e.g. if gates with no delay tie the
+                circuit together.
+        
+        Raises:
+            ValueError: An exception if the simulation is in inertial delay
+                mode, which partitions don't support.
+        """
+        if simulation.inertial:
+            raise ValueError('Partitioned simulations only support transport '
+                             'delays')
+        self.simulation = simulation
+        circuit = simulation.circuit
+        order = LevelizedCircuit._levelize(circuit)
+        sources = set(gate for gate in order
+                      if all(in_gate is None for in_gate in gate.in_gates))
+        partition_of = self._partition(order, sources, partition_count)
+        self.partition_count = max(partition_of.values()) + 1
+        
+        gates = [[] for i in xrange(self.partition_count)]
+        copies = [set() for i in xrange(self.partition_count)]
+        cut_drivers = [{} for i in xrange(self.partition_count)]
+        for gate in order:
+            partition = partition_of[gate]
+            gates[partition].append(gate)
+            for in_gate in gate.in_gates:
+                if in_gate is None:
+                    continue
+                in_partition = partition_of[in_gate]
+                if in_partition == partition:
+                    continue
+                copies[partition].add(in_gate)
+                if in_gate not in sources:
+                    drives = cut_drivers[in_partition].setdefault(
+                        in_gate.name, [])
+                    if partition not in drives:
+                        drives.append(partition)
+        
+        self.cut_drivers = cut_drivers
+        delays = [circuit.gates[name].gate_type.delay
+                  for drivers in cut_drivers for name in drivers]
+        self.lookahead = min(delays) if len(delays) > 0 else None
+        self.texts = [self._partition_text(gates[i], copies[i], sources)
+                      for i in xrange(self.partition_count)]
+    
+    @staticmethod
+    def _partition(order, sources, partition_count):
+        # Assigns a partition number to every gate. Gates with no delay are
+        # grouped with the gates they drive, and the groups are split into
+        # partitions of about the same number of gates, in topological order.
+        # The circuit's inputs all go in partition 0.
+        parents = {}
+        def find(gate):
+            root = gate
+            while parents.get(root, root) != root:
+                root = parents[root]
+            while gate != root:
+                parents[gate], gate = root, parents.get(gate, gate)
+            return root
+        for gate in order:
+            if gate in sources or gate.gate_type.delay != 0:
+                continue
+            for out_gate in gate.out_gates:
+                root, out_root = find(gate), find(out_gate)
+                if root != out_root:
+                    parents[out_root] = root
+        
+        partition_of = {}
+        group_partitions = {}
+        size = max(1, (len(order) - len(sources) + partition_count - 1) //
+                   partition_count)
+        partition, count = 0, 0
+        for gate in order:
+            if gate in sources:
+                partition_of[gate] = 0
+                continue
+            root = find(gate)
+            if root not in group_partitions:
+                if count >= size:
+                    partition, count = partition + 1, 0
+                group_partitions[root] = partition
+            partition_of[gate] = group_partitions[root]
+            if group_partitions[root] == partition:
+                count += 1
+        return partition_of
+    
+    def _partition_text(self, gates, copies, sources):
+        # The textual description of a partition's circuit: all the truth
+        # tables and gate types, the copies of other partitions' gates (with no
+        # inputs connected), the partition's own gates, and the probes and flips
+        # of its gates and its copies of the circuit's inputs.
+        circuit = self.simulation.circuit
+        lines = []
+        for table in circuit.truth_tables.values():
+            lines.append(' '.join(['table', table.name] +
+                                  [str(entry) for entry in table.flat_table]))
+        for gate_type in circuit.gate_types.values():
+            lines.append('type %s %s %d' % (gate_type.name,
+                                            gate_type.truth_table.name,
+                                            gate_type.delay))
+        for gate in copies:
+            lines.append('gate %s %s' % (gate.name, gate.gate_type.name))
+        for gate in gates:
+            lines.append(' '.join(['gate', gate.name, gate.gate_type.name] +
+                                  [in_gate.name for in_gate in gate.in_gates
+                                   if in_gate is not None]))
+        for gate in gates:
+            if gate.probed:
+                lines.append('probe ' + gate.name)
+        names = set(gate.name for gate in gates)
+        names.update(gate.name for gate in copies if gate in sources)
+        for in_transition in self.simulation.in_transitions:
+            if in_transition[1] in names:
+                lines.append('flip %s %d %d' % (in_transition[1],
+                                                in_transition[2],
+                                                in_transition[0]))
+        lines.append('done')
+        return '\n'.join(lines) + '\n'
+    
+    def run(self, processes=True):
+        """Runs the simulation to completion.
+        
+        The probe results are stored in (or streamed by) the simulation, as if
+        Simulation.run had been called. The gates' outputs are not updated.
+        
+        Args:
+            processes: If False, the partitions are run one after the other in
+                this process, which is only useful for debugging.
+        
+        Raises:
+            ValueError: An exception if the simulation collects statistics,
+                which the partitions don't.
+        """
+        if self.simulation.stats is not None:
+            raise ValueError('Partitioned simulations do not collect '
+                             'statistics')
+        queue_class = self.simulation.queue_class
+        self.connections = None
+        if processes:
+            self.connections = []
+            self.processes = []
+            for i in xrange(self.partition_count):
+                connection, child_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=partition_worker_main,
+                    args=(child_connection, self.texts[i], self.cut_drivers[i],
+                          queue_class))
+                process.start()
+                self.connections.append(connection)
+                self.processes.append(process)
+        else:
+            self.workers = [PartitionWorker(self.texts[i], self.cut_drivers[i],
+                                            queue_class)
+                            for i in xrange(self.partition_count)]
+        
+        try:
+            times = self._call('next_time', [()] * self.partition_count)
+            while any(time is not None for time in times):
+                start = min(time for time in times if time is not None)
+                end = None
+                if self.lookahead is not None:
+                    end = start + self.lookahead
+                    messages = self._call('collect', [(end,)] *
+                                          self.partition_count)
+                changes = [[] for i in xrange(self.partition_count)]
+                if end is not None:
+                    for outgoing in messages:
+                        for partition, partition_changes in outgoing.items():
+                            changes[partition].extend(partition_changes)
+                times = self._call('run', [(end, partition_changes)
+                                           for partition_changes in changes])
+            probes = []
+            for partition_probes in self._call('probes',
+                                               [()] * self.partition_count):
+                probes.extend(partition_probes)
+        finally:
+            if self.connections is not None:
+                for connection in self.connections:
+                    connection.send((None, ()))
+                for process in self.processes:
+                    process.join()
+        
+        probes.sort()
+        if self.simulation.probe_stream is None:
+            self.simulation.probes = probes
+        else:
+            for probe in probes:
+                self.simulation.probe_stream.append(probe)
+            self.simulation.probe_stream.flush()
+    
+    def _call(self, method, args_list):
+        # Calls a PartitionWorker method on every partition, with the matching
+        # arguments in args_list, and returns the list of results. The workers
+        # in other processes all run at the same time.
+        if self.connections is None:
+            return [getattr(worker, method)(*args)
+                    for worker, args in zip(self.workers, args_list)]
+        for connection, args in zip(self.connections, args_list):
+            connection.send((method, args))
+        results = [connection.recv() for connection in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+class CompiledCircuit:
+    """A circuit compiled into flat arrays, for running many simulations.
+    
+    Gates are numbered as in the circuit's GateArrays, whose arrays are
+    copied, and the compiled circuit keeps its own outputs and packed input
+    bits (see Gate.input_bits). The event queue holds (gate number, new output)
+    pairs in a FIFO bucket per time, like CalendarQueue, instead of Transition
+    instances. So resetting the circuit between runs just refills the arrays,
+    and each run gives the same probe results as Simulation.run.
+    """
+    
+    def __init__(self, circuit):
+        """Compiles a complete circuit.
+        
+        Args:
+            circuit: The Circuit to compile. It is not used after compiling.
+        """
+        # The circuit's GateArrays are already numbered this way, so they are
+        # copied, except for the state.
+        arrays = circuit.arrays
+        self.gate_names = list(arrays.names)
+        self.gate_ids = dict(arrays.ids)
+        self.tables = list(arrays.tables)
+        self.gate_tables = array.array('l', arrays.table_ids)
+        self.delays = array.array('l', arrays.delays)
+        self.probed = bytearray(arrays.probed)
+        self.out_offsets, self.out_ids, self.out_masks = [
+            array.array('l', column) for column in arrays.fan_out()]
+        self.reset()
+    
+    def reset(self):
+        """Puts every gate's output and inputs back to 0.
+        
+        Called by run, before each simulation.
+        """
+        count = len(self.gate_names)
+        self.outputs = bytearray(count)
+        self.input_bits = array.array('l', [0]) * count
+    
+    def run(self, flips):
+        """Simulates the circuit from its reset state.
+        
+        Args:
+            flips: A list of (gate name, new output, time) tuples, the initial
+                conditions given by add_transition to a Simulation.
+        
+        Returns:
+            The probe results, as a list of [time, gate name, new output] lists
+            in the order of Simulation.probes after Simulation.run.
+        """
+        self.reset()
+        outputs = self.outputs
+        input_bits = self.input_bits
+        names = self.gate_names
+        tables = self.tables
+        gate_tables = self.gate_tables
+        delays = self.delays
+        probed = self.probed
+        out_offsets = self.out_offsets
+        out_ids = self.out_ids
+        out_masks = self.out_masks
+        
+        buckets = {}
+        times = []
+        for time, name, output in sorted((time, name, output)
+                                         for name, output, time in flips):
+            if output != 0 and output != 1:
+                raise ValueError('Invalid output value')
+            if time not in buckets:
+                buckets[time] = []
+                heapq.heappush(times, time)
+            buckets[time].append((self.gate_ids[name], output))
+        
+        probes = []
+        while len(times) > 0:
+            step_time = heapq.heappop(times)
+            # Transitions that a gate with no delay schedules at step_time go
+            # in a new bucket, which is the next step.
+            bucket = buckets.pop(step_time)
+            
+            # Need to apply all the transitions at the same time before
+            # propagating.
+            changed = []
+            for gate, output in bucket:
+                if outputs[gate] == output:
+                    continue
+                outputs[gate] = output
+                if probed[gate]:
+                    probes.append([step_time, names[gate], output])
+                for i in xrange(out_offsets[gate], out_offsets[gate + 1]):
+                    input_bits[out_ids[i]] ^= out_masks[i]
+                changed.append(gate)
+            
+            # Propagate the transition effects.
+            for gate in changed:
+                for i in xrange(out_offsets[gate], out_offsets[gate + 1]):
+                    out_gate = out_ids[i]
+                    time = step_time + delays[out_gate]
+                    output = tables[gate_tables[out_gate]][input_bits[out_gate]]
+                    if time in buckets:
+                        buckets[time].append((out_gate, output))
+                    else:
+                        buckets[time] = [(out_gate, output)]
+                        heapq.heappush(times, time)
+        
+        probes.sort()
+        return probes
+    
+    def run_all(self, flips_list, processes=None):
+        """Simulates the circuit once for each set of initial conditions.
+        
+        Args:
+            flips_list: A list of flips lists, as taken by run.
+            processes: The number of worker processes to spread the runs over,
+                or None to do all the runs in this process.
+        
+        Returns:
+            A list with the probe results of each run, as returned by run.
+        """
+        if processes is None:
+            return [self.run(flips) for flips in flips_list]
+        pool = multiprocessing.Pool(processes, compiled_circuit_pool_init,
+                                    (self,))
+        try:
+            chunk_size = max(1, len(flips_list) // (4 * processes))
+            return pool.map(compiled_circuit_pool_run, flips_list, chunk_size)
+        finally:
+            pool.close()
+            pool.join()
+    
+    @staticmethod
+    def simulation_flips(simulation):
+        """The initial conditions of a Simulation, as a flips list for run."""
+        return [(in_transition[1], in_transition[2], in_transition[0])
+                for in_transition in simulation.in_transitions]
+
+# The CompiledCircuit of a CompiledCircuit.run_all worker process.
+pool_circuit = None
+
+def compiled_circuit_pool_init(circuit):
+    """Initializes a CompiledCircuit.run_all worker process."""
+    global pool_circuit
+    pool_circuit = circuit
+
+def compiled_circuit_pool_run(flips):
+    """Runs one simulation in a CompiledCircuit.run_all worker process."""
+    return pool_circuit.run(flips)
+
 # Command-line controller.
 if __name__ == '__main__':
     import sys
-    sim = Simulation.from_file(sys.stdin)
+    queue_class = PriorityQueue
+    if os.environ.get('QUEUE') == 'calendar':
+        queue_class = CalendarQueue
+    inertial = os.environ.get('DELAY') == 'inertial'
+    if os.environ.get('CACHE') and os.environ.get('TRACE') != 'jsonp':
+        # Python 3 reads bytes from stdin.buffer.
+        data = getattr(sys.stdin, 'buffer', sys.stdin).read()
+        netlist = Netlist.from_cache(data, os.environ['CACHE'])
+        sim = netlist.to_simulation(queue_class, inertial)
+    else:
+        sim = Simulation.from_file(sys.stdin, queue_class, inertial)
     if os.environ.get('TRACE') == 'jsonp':
         sim.layout_from_file(sys.stdin)
         sim.probe_all_gates()
-    sim.run()
+    else:
+        sim.stream_outputs_to_file(sys.stdout)
+    if os.environ.get('STATS'):
+        if os.environ.get('PARTITIONS'):
+            sys.stderr.write('STATS is not supported with PARTITIONS\n')
+            sys.exit(1)
+        stats = sim.collect_stats()
+    if os.environ.get('PARTITIONS'):
+        PartitionedSimulation(sim, int(os.environ['PARTITIONS'])).run()
+    else:
+        sim.run()
+    # Statistics go to stderr, so they don't mix with the probe results.
+    if os.environ.get('STATS') == 'json':
+        json.dump(stats.as_json(), sys.stderr, indent=2, sort_keys=True)
+        sys.stderr.write("\n")
+    elif os.environ.get('STATS') == 'flame':
+        for line in stats.flame_lines():
+            sys.stderr.write(line + "\n")
     if os.environ.get('TRACE') == 'jsonp':
         sim.undo_probe_all_gates()
         sim.jsonp_to_file(sys.stdout)
-    else:
-        sim.outputs_to_file(sys.stdout)
 
@@ -3,8 +3,18 @@
 import unittest
 import sys
 import glob
+import json
+import random
 import re
+import shutil
+import tempfile
+try:
+    from StringIO import StringIO
+    BytesIO = StringIO
+except ImportError:
+    from io import BytesIO, StringIO
 from circuit import *
+import generate
 
 class CircuitTest(unittest.TestCase):
     def setUp(self):
@@ -19,6 +29,374 @@ class CircuitTest(unittest.TestCase):
                 return False
         return file.readline() == ''
 
+    def _gold_files(self):
+        # The test inputs that have expected outputs.
+        return [in_filename for in_filename in self._in_files
+                if os.path.exists(re.sub('\.in$', '.gold', in_filename))]
+
+    def _check_outputs(self, make_simulation):
+        # Runs make_simulation(in_file) on every test input, and compares the
+        # outputs of the simulation it returns with the expected outputs.
+        for in_filename in self._gold_files():
+            with open(in_filename) as in_file:
+                sim = make_simulation(in_file)
+            sim.run()
+            out_lines = sim.outputs_to_line_list()
+            gold_filename = re.sub('\.in$', '.gold', in_filename)
+            with open(gold_filename) as gold_file:
+                self.assertTrue(self._cmp_files(gold_file, out_lines),
+                                in_filename)
+
+    def testTruthTableBits(self):
+        table = TruthTable('mux', [0, 0, 1, 1, 0, 1, 0, 1])
+        for bits in xrange(8):
+            inputs = [(bits >> 2) & 1, (bits >> 1) & 1, bits & 1]
+            self.assertEqual(table.output(inputs), table.output_from_bits(bits))
+
+    def testGateInputBits(self):
+        circuit = Circuit()
+        circuit.add_truth_table('eq', [0, 1])
+        circuit.add_truth_table('mux', [0, 0, 1, 1, 0, 1, 0, 1])
+        circuit.add_gate_type('in', 'eq', 0)
+        circuit.add_gate_type('mux', 'mux', 1)
+        for name in ['s', 'a', 'b']:
+            circuit.add_gate(name, 'in', [])
+        gate = circuit.add_gate('m', 'mux', ['s', 'a', 'b'])
+        for name, output in [('a', 1), ('s', 1), ('a', 0), ('b', 1)]:
+            Transition(circuit.gates[name], output, 0).apply()
+            inputs = [g.output for g in gate.in_gates]
+            self.assertEqual(inputs[0] * 4 + inputs[1] * 2 + inputs[2],
+                             gate.input_bits)
+            self.assertEqual(gate.gate_type.output(inputs),
+                             gate.transition_output())
+
+    def testGateArrays(self):
+        circuit = Circuit()
+        circuit.add_truth_table('eq', [0, 1])
+        circuit.add_truth_table('and', [0, 0, 0, 1])
+        circuit.add_gate_type('in', 'eq', 0)
+        circuit.add_gate_type('and', 'and', 2)
+        circuit.add_gate('a', 'in', [])
+        circuit.add_gate('b', 'in', [])
+        circuit.add_gate('ab', 'and', ['a', 'b'])
+        circuit.add_gate('ba', 'and', ['b', 'a'])
+        arrays = circuit.arrays
+        self.assertEqual(['a', 'b', 'ab', 'ba'], arrays.names)
+        self.assertEqual(circuit.gates['ab'], circuit.gates['ab'])
+        self.assertEqual(hash(circuit.gates['ab']), hash(circuit.gates['ab']))
+        self.assertNotEqual(circuit.gates['ab'], circuit.gates['ba'])
+        self.assertEqual(['ab', 'ba'], list(circuit.gates)[2:])
+        self.assertEqual([0, 0, 1, 1], list(arrays.table_ids))
+        out_offsets, out_ids, out_masks = arrays.fan_out()
+        self.assertEqual([0, 2, 4, 4, 4], list(out_offsets))
+        self.assertEqual([2, 3, 2, 3], list(out_ids))
+        self.assertEqual([2, 1, 1, 2], list(out_masks))
+        gate = circuit.gates['ba']
+        self.assertEqual(['b', 'a'], [g.name for g in gate.in_gates])
+        self.assertEqual([gate, circuit.gates['ab']],
+                         circuit.gates['b'].out_gates[::-1])
+        self.assertRaises(RuntimeError, gate.connect_input,
+                          circuit.gates['a'], 0)
+
+    def testCalendarQueueOrder(self):
+        gate = Gate('g', GateType('eq', TruthTable('eq', [0, 1]), 0))
+        times = [5, 3, 5, 0, 3, 9, 0, 5, 2]
+        transitions = [Transition(gate, 1, time) for time in times]
+        queue = CalendarQueue()
+        for transition in transitions:
+            queue.append(transition)
+        self.assertEqual(len(transitions), len(queue))
+        popped = []
+        while len(queue) > 0:
+            self.assertTrue(queue.min() is queue.min())
+            popped.append(queue.pop())
+        self.assertEqual(sorted(transitions), popped)
+        self.assertRaises(UserWarning, queue.pop)
+
+    def testCalendarQueueCorrectness(self):
+        self._check_outputs(lambda in_file: Simulation.from_file(
+            in_file, CalendarQueue))
+
+    def testLevelizedCircuit(self):
+        for in_filename in self._in_files:
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file, CalendarQueue)
+            levelized = LevelizedCircuit(sim.circuit)
+            values = levelized.evaluate(LevelizedCircuit.settled_inputs(sim))
+            sim.run()
+            for name, gate in sim.circuit.gates.items():
+                self.assertEqual(gate.output,
+                                 values[levelized.gate_ids[name]], name)
+
+    def testLevelizedCircuitCycle(self):
+        circuit = Circuit()
+        circuit.add_truth_table('not', [1, 0])
+        circuit.add_gate_type('not', 'not', 1)
+        gate1 = circuit.add_gate('g1', 'not', [])
+        gate2 = circuit.add_gate('g2', 'not', ['g1'])
+        gate1.connect_input(gate2, 0)
+        self.assertRaises(ValueError, LevelizedCircuit, circuit)
+
+    def testBitwiseExpression(self):
+        for entries in [[0, 1], [1, 0], [0, 0, 0, 1], [1, 1, 1, 0],
+                        [0, 1, 1, 0], [1, 0, 0, 1], [1, 1, 1, 1],
+                        [0, 0, 1, 1, 0, 1, 0, 1], [0, 1, 1, 1, 1, 1, 1, 0]]:
+            table = TruthTable('t', entries)
+            count = len(entries)
+            names = ['x%d' % i for i in xrange(table.input_count)]
+            variables = {'m': (1 << count) - 1}
+            for i, name in enumerate(names):
+                shift = table.input_count - 1 - i
+                variables[name] = sum(((j >> shift) & 1) << j
+                                      for j in xrange(count))
+            result = eval(table.bitwise_expression(names), variables)
+            self.assertEqual(sum(entries[j] << j for j in xrange(count)),
+                             result)
+
+    def testBitParallelCircuit(self):
+        rng = random.Random(6006)
+        for in_filename in self._in_files:
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file)
+            levelized = LevelizedCircuit(sim.circuit)
+            parallel = BitParallelCircuit(sim.circuit)
+            parallel.width = 50
+            names = [levelized.gates[i].name for i in levelized.input_ids]
+            input_list = [dict((name, rng.randint(0, 1)) for name in names)
+                          for i in xrange(120)]
+            expected = [levelized.probe_outputs(levelized.evaluate(inputs))
+                        for inputs in input_list]
+            self.assertEqual(expected, parallel.evaluate_all(input_list))
+
+    def testBitParallelCircuitRunAll(self):
+        rng = random.Random(6006)
+        for in_filename in self._in_files:
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file)
+            compiled = CompiledCircuit(sim.circuit)
+            parallel = BitParallelCircuit(sim.circuit)
+            parallel.width = 30
+            names = [parallel.gates[i].name for i in parallel.input_ids]
+            flips_list = [CompiledCircuit.simulation_flips(sim)]
+            for i in xrange(40):
+                flips_list.append([(name, rng.randint(0, 1), time)
+                                   for name in names
+                                   for time in rng.sample(xrange(20), 3)])
+            self.assertEqual(compiled.run_all(flips_list),
+                             parallel.run_all(flips_list))
+            if names:
+                self.assertRaises(ValueError, parallel.run_all,
+                                  [[(names[0], 1, 5), (names[0], 0, 5)]])
+
+    def testBitParallelCircuitZeroDelay(self):
+        circuit = Circuit()
+        circuit.add_truth_table('eq', [0, 1])
+        circuit.add_gate_type('in', 'eq', 0)
+        circuit.add_gate('a', 'in', [])
+        circuit.add_gate('b', 'in', ['a'])
+        parallel = BitParallelCircuit(circuit)
+        self.assertRaises(ValueError, parallel.run_all, [[('a', 1, 0)]])
+
+    def testProbeStream(self):
+        for in_filename in self._gold_files():
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file, CalendarQueue)
+            out_file = StringIO()
+            sim.stream_outputs_to_file(out_file)
+            sim.run()
+            self.assertEqual([], sim.probes)
+            gold_filename = re.sub('\.in$', '.gold', in_filename)
+            with open(gold_filename) as gold_file:
+                self.assertEqual(gold_file.read(), out_file.getvalue())
+
+    def testProbeStreamWhileRunning(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            for in_filename in self._gold_files():
+                with open(in_filename) as in_file:
+                    sim = Simulation.from_file(in_file, CalendarQueue)
+                gold_filename = re.sub('\.in$', '.gold', in_filename)
+                with open(gold_filename) as gold_file:
+                    gold_lines = gold_file.readlines()
+                out_filename = os.path.join(out_dir, 'probes.out')
+                with open(out_filename, 'w') as out_file:
+                    reader = open(out_filename)
+                    sim.stream_outputs_to_file(out_file)
+                    sim.start()
+                    read = 0
+                    while len(sim.queue) > 0:
+                        step_time = sim.step()
+                        if (len(sim.queue) > 0 and
+                            sim.queue.min().time == step_time):
+                            continue
+                        # Every result up to step_time is in the file already.
+                        end = read
+                        while (end < len(gold_lines) and
+                               int(gold_lines[end].split()[0]) <= step_time):
+                            end += 1
+                        self.assertEqual(gold_lines[read:end],
+                                         reader.readlines())
+                        read = end
+                    reader.close()
+                self.assertEqual(len(gold_lines), read)
+        finally:
+            shutil.rmtree(out_dir)
+
+    def testFromFileWithoutDone(self):
+        in_file = StringIO('table eq 0 1\ntype in eq 0\ngate a in\n')
+        self.assertRaises(ValueError, Simulation.from_file, in_file)
+        self.assertRaises(ValueError, Netlist.parse, in_file.getvalue())
+
+    def testNetlist(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for in_filename in self._gold_files():
+                with open(in_filename, 'rb') as in_file:
+                    data = in_file.read()
+                netlist = Netlist.from_cache(data, cache_dir)
+                out_file = BytesIO()
+                netlist.save(out_file)
+                loaded = Netlist.load(BytesIO(out_file.getvalue()))
+                self.assertEqual(netlist._sections(), loaded._sections())
+                cached = Netlist.from_cache(data, cache_dir)
+                self.assertEqual(netlist._sections(), cached._sections())
+            self.assertEqual(len(self._gold_files()),
+                             len(os.listdir(cache_dir)))
+        finally:
+            shutil.rmtree(cache_dir)
+        self._check_outputs(lambda in_file: Netlist.parse(
+            in_file.read()).to_simulation(CalendarQueue))
+
+    def testPartitionedSimulation(self):
+        def run_partitioned(in_file):
+            sim = Simulation.from_file(in_file, CalendarQueue)
+            partitioned = PartitionedSimulation(sim, 3)
+            partitioned.run(processes=False)
+            sim.run = lambda: None
+            return sim
+        self._check_outputs(run_partitioned)
+
+    def testPartitionedSimulationProcesses(self):
+        for in_filename in self._in_files:
+            if not in_filename.endswith('8multiplier.in'):
+                continue
+            with open(in_filename) as in_file:
+                expected = Simulation.from_file(in_file)
+            expected.run()
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file)
+            PartitionedSimulation(sim, 2).run()
+            self.assertEqual(expected.probes, sim.probes)
+
+    def testInertialDelay(self):
+        results = []
+        for inertial in [False, True]:
+            circuit = Circuit()
+            circuit.add_truth_table('eq', [0, 1])
+            circuit.add_gate_type('in', 'eq', 0)
+            circuit.add_gate_type('buf', 'eq', 3)
+            circuit.add_gate('a', 'in', [])
+            circuit.add_gate('b', 'buf', ['a'])
+            circuit.add_probe('b')
+            sim = Simulation(circuit, CalendarQueue, inertial)
+            # A pulse shorter than the delay, then one as long as the delay.
+            for output, time in [(1, 0), (0, 2), (1, 10), (0, 13)]:
+                sim.add_transition('a', output, time)
+            sim.run()
+            results.append(sim.probes)
+        self.assertEqual([[3, 'b', 1], [5, 'b', 0], [13, 'b', 1],
+                          [16, 'b', 0]], results[0])
+        self.assertEqual([[13, 'b', 1], [16, 'b', 0]], results[1])
+
+    def testInertialDelayPartitioned(self):
+        with open(self._gold_files()[0]) as in_file:
+            sim = Simulation.from_file(in_file, PriorityQueue, True)
+        self.assertRaises(ValueError, PartitionedSimulation, sim, 2)
+
+    def testSimulationStats(self):
+        for in_filename in self._gold_files():
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file, CalendarQueue)
+            stats = sim.collect_stats()
+            sim.run()
+            result = json.loads(json.dumps(stats.as_json(3)))
+            self.assertEqual(result['events_pushed'],
+                             result['transitions_valid'] +
+                             result['transitions_discarded'])
+            self.assertEqual(result['steps'],
+                             sum(entry[2] for entry in
+                                 result['queue_depth']['histogram']))
+            self.assertTrue(result['queue_depth']['peak'] >=
+                            result['queue_depth']['average'])
+            self.assertEqual(result['transitions_valid'],
+                             sum(stats.activity))
+            top = result['top_gates']
+            self.assertTrue(len(top) <= 3)
+            self.assertEqual(sorted(top, key=lambda entry: -entry[1]), top)
+            self.assertEqual(['run', 'run;start', 'run;step;apply',
+                              'run;step;propagate', 'run;output'],
+                             [line.split()[0] for line in stats.flame_lines()])
+
+    def testSimulationStatsPartitioned(self):
+        with open(self._gold_files()[0]) as in_file:
+            sim = Simulation.from_file(in_file)
+        sim.collect_stats()
+        self.assertRaises(ValueError,
+                          PartitionedSimulation(sim, 2).run, False)
+
+    def testCompiledCircuit(self):
+        for in_filename in self._gold_files():
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file)
+            compiled = CompiledCircuit(sim.circuit)
+            flips = CompiledCircuit.simulation_flips(sim)
+            sim.run()
+            # The second run checks that the first one was reset.
+            self.assertEqual(sim.probes, compiled.run(flips))
+            self.assertEqual(sim.probes, compiled.run(flips))
+
+    def testCompiledCircuitRunAll(self):
+        for in_filename in self._in_files:
+            if not in_filename.endswith('8multiplier.in'):
+                continue
+            with open(in_filename) as in_file:
+                sim = Simulation.from_file(in_file)
+            compiled = CompiledCircuit(sim.circuit)
+            flips = CompiledCircuit.simulation_flips(sim)
+            flips_list = [flips[:i] for i in xrange(0, len(flips), 4)]
+            expected = compiled.run_all(flips_list)
+            self.assertEqual(flips_list[0], [])
+            self.assertEqual(expected[0], [])
+            self.assertEqual(expected, compiled.run_all(flips_list, 2))
+
+    def testGenerators(self):
+        def simulate(writer):
+            # The final value of each gate, after the last input vector.
+            writer.add_random_flips(6)
+            sim = Simulation.from_file(StringIO("\n".join(writer.lines())))
+            sim.run()
+            return dict((name, sim.circuit.gates[name].output)
+                        for name in sim.circuit.gates)
+        def number(values, names):
+            return sum(values[name] << i for i, name in enumerate(names))
+
+        values = simulate(generate.multiplier(5))
+        self.assertEqual(number(values, ['a%d' % i for i in xrange(5)]) *
+                         number(values, ['b%d' % i for i in xrange(5)]),
+                         number(values, ['c%d' % i for i in xrange(10)]))
+        values = simulate(generate.bitonic_sorter(16))
+        self.assertEqual(sorted(values['x%d' % i] for i in xrange(16)),
+                         [values['y%d' % i] for i in xrange(16)])
+        writer = generate.adder_tree(5, 4)
+        values = simulate(writer)
+        self.assertEqual(sum(number(values, ['n%d_%d' % (i, bit)
+                                             for bit in xrange(4)])
+                             for i in xrange(5)),
+                         number(values, writer.probes))
+        writer = generate.random_dag(400, 8, 3)
+        self.assertEqual(450, len(simulate(writer)))
+        self.assertEqual(50, len(writer.probes))
+
     def testCorrectness(self):
         print 'Testing correctness:'
         for in_filename in self._in_files:
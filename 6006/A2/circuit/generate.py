@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+import os     # Used to get the DEPTH, FANOUT and BITS environment variables
+import random
+import sys    # Used to smooth over the range / xrange issue.
+
+# Python 3 doesn't have xrange, and range behaves like xrange.
+if sys.version_info >= (3,):
+    xrange = range
+
+
+# Synthetic circuit generator for the circuit simulator.
+
+class NetlistWriter:
+    """Builds a circuit description in the simulator's input format.
+
+    The circuit uses a small library of 2-input gate types, and 0-delay "in"
+    gates for its inputs, like the test cases. The writer keeps track of each
+    gate's arrival time, the longest delay from the circuit's inputs to the
+    gate's output, so stimulus can be spaced out enough for the circuit to
+    settle between input vectors.
+    """
+
+    # Truth table name -> truth table outputs.
+    TABLES = [('eq', [0, 1]), ('and2', [0, 0, 0, 1]), ('or2', [0, 1, 1, 1]),
+              ('xor2', [0, 1, 1, 0]), ('nand2', [1, 1, 1, 0])]
+    # Gate type name -> (truth table name, delay).
+    TYPES = [('in', 'eq', 0), ('and2', 'and2', 2), ('or2', 'or2', 2),
+             ('xor2', 'xor2', 3), ('nand2', 'nand2', 1)]
+
+    def __init__(self):
+        """Creates an empty circuit that has the gate library."""
+        self.delays = dict((name, delay) for name, table, delay in self.TYPES)
+        self.gates = []
+        self.inputs = []
+        self.probes = []
+        self.flips = []
+        self.arrival = {}
+
+    def add_input(self, name):
+        """Adds an input gate.
+
+        Returns:
+            The gate's name.
+        """
+        self.gates.append((name, 'in', []))
+        self.inputs.append(name)
+        self.arrival[name] = 0
+        return name
+
+    def add_gate(self, name, type_name, input_names):
+        """Adds a gate, connected to existing gates.
+
+        Returns:
+            The gate's name.
+        """
+        self.gates.append((name, type_name, input_names))
+        self.arrival[name] = self.delays[type_name] + max(
+            self.arrival[input_name] for input_name in input_names)
+        return name
+
+    def add_probe(self, name):
+        """Marks a gate as probed."""
+        self.probes.append(name)
+
+    def settle_time(self):
+        """The longest time an input change takes to reach a gate's output."""
+        return max(self.arrival.values())
+
+    def add_random_flips(self, vectors, seed=0):
+        """Adds flips that apply random input vectors, one at a time.
+
+        All the inputs start at 0, at time 0, and each vector is applied once
+        the circuit has settled from the previous one, by flipping the inputs
+        that change.
+
+        Args:
+            vectors: The number of random input vectors.
+            seed: The seed of the random numbers.
+        """
+        rng = random.Random(seed)
+        period = self.settle_time() + 1
+        values = dict((name, 0) for name in self.inputs)
+        for name in self.inputs:
+            self.flips.append((name, 0, 0))
+        for vector in xrange(vectors):
+            for name in self.inputs:
+                value = rng.randint(0, 1)
+                if value != values[name]:
+                    self.flips.append((name, value, (vector + 1) * period))
+                    values[name] = value
+
+    def lines(self):
+        """The circuit description, as a list of lines."""
+        lines = ['# Circuit: tables']
+        for name, outputs in self.TABLES:
+            lines.append(' '.join(['table', name] +
+                                  [str(output) for output in outputs]))
+        lines.extend(['', '# Circuit: types'])
+        for name, table, delay in self.TYPES:
+            lines.append('type %s %s %d' % (name, table, delay))
+        lines.extend(['', '# Circuit: gates'])
+        for name, type_name, input_names in self.gates:
+            lines.append(' '.join(['gate', name, type_name] + input_names))
+        lines.extend(['', '# Circuit: probes'])
+        for name in self.probes:
+            lines.append('probe ' + name)
+        lines.extend(['', '# Simulation: inputs'])
+        for name, output, time in self.flips:
+            lines.append('flip %s %d %d' % (name, output, time))
+        lines.append('done')
+        return lines
+
+    def write(self, file):
+        """Writes the circuit description to a file."""
+        for line in self.lines():
+            file.write(line)
+            file.write("\n")
+
+def add_adder(writer, prefix, xs, ys):
+    """Adds a ripple-carry adder.
+
+    Args:
+        writer: The NetlistWriter that receives the adder's gates.
+        prefix: A string that starts the names of the adder's gates.
+        xs, ys: The names of the gates holding the two numbers to add, least
+            significant bit first. Both lists must have the same length, and
+            None stands for a 0 bit.
+
+    Returns:
+        The names of the gates holding the sum (or None for a 0 bit), least
+        significant bit first, with one more bit than the numbers.
+    """
+    sums = []
+    carry = None
+    for i in xrange(len(xs)):
+        bits = [bit for bit in [xs[i], ys[i], carry] if bit is not None]
+        name = '%s_%d' % (prefix, i)
+        if len(bits) < 2:
+            sums.append(bits[0] if bits else None)
+            carry = None
+        elif len(bits) == 2:
+            # Half adder.
+            sums.append(writer.add_gate(name + 's', 'xor2', bits))
+            carry = writer.add_gate(name + 'c', 'and2', bits)
+        else:
+            # Full adder.
+            half = writer.add_gate(name + 'h', 'xor2', bits[:2])
+            sums.append(writer.add_gate(name + 's', 'xor2', [half, bits[2]]))
+            carry = writer.add_gate(name + 'c', 'or2', [
+                writer.add_gate(name + 'g', 'and2', bits[:2]),
+                writer.add_gate(name + 'p', 'and2', [half, bits[2]])])
+    sums.append(carry)
+    return sums
+
+def multiplier(bits):
+    """An array multiplier of two bits-bit numbers.
+
+    The inputs are a0... and b0..., and the probed outputs are c0..., least
+    significant bit first. Each row of partial products is added to the running
+    sum with a ripple-carry adder. The circuit has about 6 * bits^2 gates.
+    """
+    writer = NetlistWriter()
+    a = [writer.add_input('a%d' % i) for i in xrange(bits)]
+    b = [writer.add_input('b%d' % i) for i in xrange(bits)]
+    total = [None] * (2 * bits)
+    for i in xrange(bits):
+        row = [None] * i + [writer.add_gate('p%d_%d' % (i, j), 'and2',
+                                            [a[j], b[i]])
+                            for j in xrange(bits)]
+        row += [None] * (2 * bits - len(row))
+        total = add_adder(writer, 'r%d' % i, total, row)[:2 * bits]
+    for i, bit in enumerate(total):
+        if bit is None:
+            bit = writer.add_gate('c%d' % i, 'xor2', [a[0], a[0]])
+        else:
+            bit = writer.add_gate('c%d' % i, 'or2', [bit, bit])
+        writer.add_probe(bit)
+    return writer
+
+def bitonic_sorter(size):
+    """A bitonic sorting network for size 1-bit inputs.
+
+    size must be a power of 2. The inputs are x0..., and the probed outputs
+    are y0..., sorted in increasing order. A compare-exchange of 1-bit values
+    is an and2 gate (the minimum) and an or2 gate (the maximum), and there are
+    about size * log(size)^2 / 4 of them.
+    """
+    if size < 1 or size & (size - 1) != 0:
+        raise ValueError('The size of a bitonic sorter must be a power of 2')
+    writer = NetlistWriter()
+    wires = [writer.add_input('x%d' % i) for i in xrange(size)]
+    stage = 0
+    block = 2
+    while block <= size:
+        distance = block // 2
+        while distance > 0:
+            for i in xrange(size):
+                j = i ^ distance
+                if j < i:
+                    continue
+                # The network sorts blocks in alternating directions.
+                low, high = (i, j) if i & block == 0 else (j, i)
+                name = 's%d_%d' % (stage, i)
+                pair = [wires[i], wires[j]]
+                wires[low] = writer.add_gate(name + 'l', 'and2', pair)
+                wires[high] = writer.add_gate(name + 'h', 'or2', pair)
+            distance //= 2
+            stage += 1
+        block *= 2
+    for i, wire in enumerate(wires):
+        writer.add_probe(writer.add_gate('y%d' % i, 'or2', [wire, wire]))
+    return writer
+
+def adder_tree(count, bits):
+    """A balanced tree of ripple-carry adders that sums count numbers.
+
+    The inputs are n<i>_<bit> for the bits-bit numbers, and the probed outputs
+    are s0..., least significant bit first.
+    """
+    writer = NetlistWriter()
+    numbers = [[writer.add_input('n%d_%d' % (i, bit)) for bit in xrange(bits)]
+               for i in xrange(count)]
+    level = 0
+    while len(numbers) > 1:
+        sums = []
+        for i in xrange(0, len(numbers) - 1, 2):
+            sums.append(add_adder(writer, 't%d_%d' % (level, i), numbers[i],
+                                  numbers[i + 1]))
+        if len(numbers) % 2 == 1:
+            sums.append(numbers[-1] + [None])
+        numbers = sums
+        level += 1
+    for i, bit in enumerate(numbers[0]):
+        if bit is not None:
+            writer.add_probe(bit)
+    return writer
+
+def random_dag(gate_count, depth, fan_out, seed=0):
+    """A random layered circuit of 2-input gates.
+
+    The circuit has depth layers of about the same number of gates, after a
+    layer of inputs of the same width. Each gate is driven by two random gates
+    of the layer before it, drawn from a random subset sized so that gates
+    drive fan_out gates of the next layer on average. The gates of the last
+    layer are probed.
+
+    Args:
+        gate_count: The number of gates that are not inputs.
+        depth: The number of layers of gates that are not inputs.
+        fan_out: The average fan-out of the gates.
+        seed: The seed of the random numbers.
+    """
+    rng = random.Random(seed)
+    writer = NetlistWriter()
+    type_names = ['and2', 'or2', 'xor2', 'nand2']
+    width = max(1, gate_count // depth)
+    layer = [writer.add_input('i%d' % i) for i in xrange(width)]
+    for level in xrange(depth):
+        drivers = rng.sample(layer, max(1, min(len(layer),
+                                               2 * width // fan_out)))
+        layer = [writer.add_gate('g%d_%d' % (level, i), rng.choice(type_names),
+                                 [rng.choice(drivers), rng.choice(drivers)])
+                 for i in xrange(width)]
+    for name in layer:
+        writer.add_probe(name)
+    return writer
+
+# Command-line controller.
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.stderr.write('Usage: generate.py multiplier|sorter|adders|random '
+                         '<size> [<vectors> [<seed>]]\n')
+        sys.exit(1)
+    kind = sys.argv[1]
+    size = int(sys.argv[2])
+    vectors = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    if kind == 'multiplier':
+        writer = multiplier(size)
+    elif kind == 'sorter':
+        writer = bitonic_sorter(size)
+    elif kind == 'adders':
+        writer = adder_tree(size, int(os.environ.get('BITS', '16')))
+    elif kind == 'random':
+        writer = random_dag(size, int(os.environ.get('DEPTH', '32')),
+                            int(os.environ.get('FANOUT', '2')), seed)
+    else:
+        raise ValueError('Unknown circuit kind ' + kind)
+    writer.add_random_flips(vectors, seed)
+    writer.write(sys.stdout)